@@ -0,0 +1,111 @@
+# benchmark of the headless Tetris engines in brick_engine
+# compares the list-of-lists board (TetrisEngine) with the bitmask board (BitboardEngine) on
+# placement-heavy work: random-bot games, and a search that tries every rotation and column
+# of the falling piece the way a placement bot does. both engines must end every game with
+# the same score, so the comparison doubles as a consistency check. prints one JSON document.
+#
+#   python bench_brick.py --games 500 --output bench_brick.json
+import argparse
+import json
+import random
+import time
+
+from bench_common import git_commit
+from brick_engine import GRID_WIDTH, BitboardEngine, TetrisEngine, random_bot_game
+
+ENGINES = {"list": TetrisEngine, "bitboard": BitboardEngine}
+
+
+def bot_games(engine_class, games, seed):
+    start = time.perf_counter()
+    pieces, outcomes = 0, []
+    for game in range(games):
+        engine = random_bot_game(seed + game, engine_class=engine_class)
+        pieces += engine.pieces_locked
+        outcomes.append((engine.score, engine.pieces_locked, engine.lines_cleared))
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 4), "games_per_second": round(games / elapsed, 1),
+            "pieces_per_second": round(pieces / elapsed, 1)}, outcomes
+
+
+def landing_row(engine, piece):
+    # dropped row by row through valid_position, like a search that scores every height on
+    # the way down; engine.drop_distance() mostly answers from the column tops instead and
+    # would leave the boards' collision checks out of the measurement
+    y = piece.y
+    while engine.valid_position(piece, 0, y + 1 - piece.y):
+        y += 1
+    return y
+
+
+def best_placement(engine):
+    # every rotation x column of the current piece; the lowest landing row wins
+    piece = engine.current_piece
+    x0, rotation0 = piece.x, piece.rotation
+    best = None
+    tried = 0
+    for rotation in range(4):
+        piece.rotation = rotation
+        for x in range(-2, GRID_WIDTH):
+            piece.x = x
+            if not engine.valid_position(piece):
+                continue
+            tried += 1
+            landing = landing_row(engine, piece)
+            if best is None or landing > best[0]:
+                best = (landing, x, rotation)
+    piece.x, piece.rotation = x0, rotation0
+    return best, tried
+
+
+def placement_search(engine_class, games, seed, max_pieces=200):
+    start = time.perf_counter()
+    placements, outcomes = 0, []
+    for game in range(games):
+        engine = engine_class(seed + game)
+        while not engine.game_over and engine.pieces_locked < max_pieces:
+            best, tried = best_placement(engine)
+            placements += tried
+            if best is None:
+                engine.step("hard_drop", frames=0)
+                continue
+            _, engine.current_piece.x, engine.current_piece.rotation = best
+            engine.step("hard_drop", frames=0)
+        outcomes.append((engine.score, engine.pieces_locked, engine.lines_cleared))
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 4), "placements_per_second": round(placements / elapsed, 1),
+            "placements": placements}, outcomes
+
+
+def run_benchmark(games, seed):
+    scenarios = {}
+    for name, run, count in (("random_bot", bot_games, games),
+                             ("placement_search", placement_search, max(1, games // 10))):
+        results, outcomes = {}, {}
+        for engine_name, engine_class in ENGINES.items():
+            random.seed(seed)
+            results[engine_name], outcomes[engine_name] = run(engine_class, count, seed)
+        results["speedup"] = round(results["list"]["seconds"] / results["bitboard"]["seconds"], 2)
+        results["same_outcomes"] = outcomes["list"] == outcomes["bitboard"]
+        results["games"] = count
+        scenarios[name] = results
+    return {"commit": git_commit(), "config": {"games": games, "seed": seed}, "scenarios": scenarios}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the Tetris engine boards")
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(run_benchmark(args.games, args.seed), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+# helpers shared by the benchmark scripts (bench_llm.py, bench_brick.py)
+import os
+import subprocess
+
+
+def git_commit():
+    # short hash of HEAD, recorded in every report so results can be compared across commits
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,157 @@
+# latency / throughput benchmark for the DeepSeekR1Model layer
+# runs against fake_ollama.FakeOllamaServer, so the numbers measure our code (client,
+# streaming, caching, concurrency) and not the model; same flags + same seed give results
+# that can be compared across commits. prints one JSON document.
+#
+#   python bench_llm.py --requests 50 --concurrency 8 --output bench.json
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_common import git_commit
+from fake_ollama import FakeOllamaConfig, FakeOllamaServer
+from ollama_client import OllamaClient
+
+PAIRS = [("天蝎座", "INFP"), ("白羊座", "ENTJ"), ("双鱼座", "ISFP"), ("狮子座", "ESFJ")]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(samples, errors, wall_seconds):
+    latency = [s["latency"] * 1000 for s in samples]
+    ttft = [s["ttft"] * 1000 for s in samples if s["ttft"] is not None]
+    rates = [s["tokens"] / s["stream_seconds"] for s in samples if s.get("stream_seconds")]
+
+    def dist(values):
+        if not values:
+            return None
+        return {
+            "p50": round(percentile(values, 50), 3),
+            "p95": round(percentile(values, 95), 3),
+            "p99": round(percentile(values, 99), 3),
+            "mean": round(sum(values) / len(values), 3),
+        }
+
+    return {
+        "requests": len(samples) + errors,
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(samples) / wall_seconds, 3) if wall_seconds else None,
+        "latency_ms": dist(latency),
+        "ttft_ms": dist(ttft),
+        "tokens_per_sec": dist(rates),
+    }
+
+
+def one_streamed(model, zodiac, mbti):
+    # one reading through stream_personality, so TTFT and token rate are visible
+    start = time.perf_counter()
+    tokens = 0
+    ttft = None
+    last = None
+    for chunk in model.stream_personality(zodiac, mbti):
+        if chunk.text:
+            tokens += 1
+        ttft = chunk.ttft
+        last = chunk
+    latency = time.perf_counter() - start
+    stream_seconds = (last.elapsed - ttft) if last is not None and ttft is not None else None
+    return {"latency": latency, "ttft": ttft, "tokens": tokens, "stream_seconds": stream_seconds}
+
+
+def one_blocking(model, zodiac, mbti):
+    start = time.perf_counter()
+    model.analyze_personality(zodiac, mbti)
+    return {"latency": time.perf_counter() - start, "ttft": None, "tokens": 0}
+
+
+def run_threads(model, requests, concurrency, call):
+    samples, errors = [], 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(call, model, *PAIRS[i % len(PAIRS)]) for i in range(requests)]
+        for future in futures:
+            try:
+                samples.append(future.result())
+            except Exception:
+                errors += 1
+    return summarize(samples, errors, time.perf_counter() - start)
+
+
+def run_batch(model, requests, concurrency):
+    pairs = [PAIRS[i % len(PAIRS)] for i in range(requests)]
+
+    async def collect():
+        return [result async for result in model.analyze_many(pairs, max_concurrency=concurrency)]
+
+    start = time.perf_counter()
+    results = asyncio.run(collect())
+    wall = time.perf_counter() - start
+    samples = [{"latency": r.elapsed, "ttft": None, "tokens": 0} for r in results if r.error is None]
+    return summarize(samples, len(results) - len(samples), wall)
+
+
+def run_benchmark(requests=40, concurrency=8, config=None, model_name="deepseek-r1:1.5b"):
+    from fate_ai import DeepSeekR1Model
+
+    config = config or FakeOllamaConfig()
+    with FakeOllamaServer(config) as server:
+        client = OllamaClient(host=server.url, max_connections=max(16, concurrency * 2))
+        # PAIRS repeats, so with coalescing the concurrent scenarios would share generations;
+        # those stay uncoalesced to be comparable across commits, coalescing gets its own scenario
+        model = DeepSeekR1Model(model_name, client=client, coalesce=False)
+        coalescing = DeepSeekR1Model(model_name, client=client, coalesce=True)
+        scenarios = {
+            "sequential_stream": run_threads(model, requests, 1, one_streamed),
+            "concurrent_stream": run_threads(model, requests, concurrency, one_streamed),
+            "concurrent_blocking": run_threads(model, requests, concurrency, one_blocking),
+            "analyze_many": run_batch(model, requests, concurrency),
+            "concurrent_stream_coalesced": run_threads(coalescing, requests, concurrency, one_streamed),
+        }
+        client.close()
+    return {
+        "commit": git_commit(),
+        "config": {
+            "requests": requests,
+            "concurrency": concurrency,
+            "model": model_name,
+            "server": dict(vars(config), text=len(config.text)),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark DeepSeekR1Model against a fake Ollama server")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--parallel", type=int, default=4, help="generation slots of the fake server")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(token_rate=args.token_rate, first_token_delay=args.first_token_delay,
+                              parallel=args.parallel, failure_rate=args.failure_rate,
+                              tokens=args.tokens, seed=args.seed)
+    report = json.dumps(run_benchmark(args.requests, args.concurrency, config), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
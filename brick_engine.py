@@ -0,0 +1,439 @@
+# 俄罗斯方块规则引擎（无界面）
+# headless rules of brick_house_game: no pygame, no window, no wall clock. time advances in
+# frames of 1/FPS seconds and pieces come from a seeded random.Random, so the same seed and
+# the same actions always give the same game. bots, tests and load tests drive it with
+# step(action); brick_house_game.TetrisGame subclasses it and only adds drawing.
+#
+#   engine = TetrisEngine(seed=42)
+#   while not engine.game_over:
+#       result = engine.step("hard_drop")
+import random
+from collections import namedtuple
+
+GRID_WIDTH = 10
+GRID_HEIGHT = 20
+FPS = 60
+
+# 方块形状定义
+SHAPES = [
+    [[1, 1, 1, 1]],  # I
+    [[1, 1, 1], [0, 1, 0]],  # T
+    [[1, 1, 1], [1, 0, 0]],  # L
+    [[1, 1, 1], [0, 0, 1]],  # J
+    [[1, 1], [1, 1]],  # O
+    [[0, 1, 1], [1, 1, 0]],  # S
+    [[1, 1, 0], [0, 1, 1]]  # Z
+]
+
+# 消除 1-4 行的基础分，乘以等级
+LINE_SCORES = [100, 300, 500, 800]
+
+ACTIONS = ("noop", "left", "right", "rotate", "soft_drop", "hard_drop", "hold")
+
+# reward: score gained by this step, lines: rows cleared, done: game over after this step,
+# locked: a piece was locked (a new one is now falling)
+StepResult = namedtuple("StepResult", ["reward", "lines", "done", "locked"])
+
+
+def rotate_shape(shape):
+    # 旋转矩阵 (90度顺时针)
+    rows = len(shape)
+    cols = len(shape[0])
+    rotated = [[0 for _ in range(rows)] for _ in range(cols)]
+    for r in range(rows):
+        for c in range(cols):
+            rotated[c][rows - 1 - r] = shape[r][c]
+    return rotated
+
+
+def _rotations(shape):
+    shapes = [shape]
+    for _ in range(3):
+        shapes.append(rotate_shape(shapes[-1]))
+    return shapes
+
+
+# 四个旋转方向预先算好：ROTATIONS[shape_idx][rotation] is the shape matrix as nested tuples,
+# CELLS[...] the (x, y) offsets of its blocks and BOUNDS[...] its (width, height).
+# looking a rotation up is a table access, nothing is rotated or allocated per call
+ROTATIONS = tuple(tuple(tuple(tuple(row) for row in shape) for shape in _rotations(base)) for base in SHAPES)
+CELLS = tuple(tuple(tuple((x, y) for y, row in enumerate(shape) for x, cell in enumerate(row) if cell)
+                    for shape in rotations) for rotations in ROTATIONS)
+BOUNDS = tuple(tuple((len(shape[0]), len(shape)) for shape in rotations) for rotations in ROTATIONS)
+# (x offset, lowest y offset) of every column of the shape, for the drop distance
+COLUMN_BOTTOMS = tuple(tuple(tuple((x, max(y for cx, y in cells if cx == x)) for x in range(width))
+                             for cells, (width, _) in zip(cells_by_rotation, bounds))
+                       for cells_by_rotation, bounds in zip(CELLS, BOUNDS))
+
+
+def fall_speed_for(level):
+    # 方块下落速度（秒）
+    return max(0.05, 0.5 - (level - 1) * 0.05)
+
+
+class Tetromino:
+    # shape_idx: None picks a random shape from rng
+    def __init__(self, x, y, shape_idx=None, rng=random):
+        self.x = x
+        self.y = y
+        self.shape_idx = rng.randint(0, len(SHAPES) - 1) if shape_idx is None else shape_idx
+        self.shape = SHAPES[self.shape_idx]
+        self.color_idx = self.shape_idx
+        self.rotation = 0
+
+    def rotate(self):
+        # the base shape turned once clockwise
+        return ROTATIONS[self.shape_idx][1]
+
+    def get_current_shape(self):
+        return ROTATIONS[self.shape_idx][self.rotation & 3]
+
+    def cells(self):
+        # (x, y) offsets of the blocks from the piece position
+        return CELLS[self.shape_idx][self.rotation & 3]
+
+    def bounds(self):
+        # (width, height) of the current rotation
+        return BOUNDS[self.shape_idx][self.rotation & 3]
+
+
+class TetrisEngine:
+    piece_class = Tetromino
+
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        # seed: None keeps going with the current generator (a new game, different pieces)
+        if seed is not None or not hasattr(self, "rng"):
+            self.rng = random.Random(seed)
+        self.board = [[0 for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
+        # 每一列最高方块所在的行（空列为 GRID_HEIGHT），随锁定 / 消行增量更新
+        self.tops = [GRID_HEIGHT] * GRID_WIDTH
+        # bumped whenever the board changes; part of the drop distance cache key
+        self.board_version = 0
+        self._drop_cache = None
+        self.current_piece = self.new_piece()
+        self.next_piece = self.new_piece()
+        self.game_over = False
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.pieces_locked = 0
+        self.fall_speed = fall_speed_for(self.level)
+        self.fall_frames = 0
+        self.frame = 0
+        self.hold_piece = None
+        self.can_hold = True
+
+    def new_piece(self):
+        return self.piece_class(GRID_WIDTH // 2 - 1, 0, rng=self.rng)
+
+    def valid_position(self, piece, x_offset=0, y_offset=0):
+        base_x = piece.x + x_offset
+        base_y = piece.y + y_offset
+        board = self.board
+        for x, y in piece.cells():
+            pos_x = base_x + x
+            pos_y = base_y + y
+
+            if (pos_x < 0 or pos_x >= GRID_WIDTH or
+                pos_y >= GRID_HEIGHT or
+                (pos_y >= 0 and board[pos_y][pos_x])):
+                return False
+        return True
+
+    # -- player moves, each returns whether it changed anything ----------------------
+
+    def move(self, dx):
+        if self.valid_position(self.current_piece, dx):
+            self.current_piece.x += dx
+            return True
+        return False
+
+    def rotate(self):
+        self.current_piece.rotation += 1
+        if not self.valid_position(self.current_piece):
+            self.current_piece.rotation -= 1
+            return False
+        return True
+
+    def soft_drop(self):
+        # 加速下落
+        if self.valid_position(self.current_piece, 0, 1):
+            self.current_piece.y += 1
+            return True
+        return False
+
+    def drop_distance(self, piece=None):
+        # rows the piece can fall; used by hard drop and the ghost piece. computed from the
+        # column tops in O(piece width) and cached until the piece moves or the board changes
+        piece = piece or self.current_piece
+        key = (piece, piece.x, piece.y, piece.rotation, self.board_version)
+        if self._drop_cache is not None and self._drop_cache[0] == key:
+            return self._drop_cache[1]
+        distance = self._surface_drop_distance(piece)
+        if distance is None:
+            distance = self._scan_drop_distance(piece)
+        self._drop_cache = (key, distance)
+        return distance
+
+    def _surface_drop_distance(self, piece):
+        # None when some column of the piece is not above that column's top (the piece was
+        # slid under an overhang): then the surface says nothing about what is below it
+        tops = self.tops
+        distance = GRID_HEIGHT
+        for dx, bottom in COLUMN_BOTTOMS[piece.shape_idx][piece.rotation & 3]:
+            x = piece.x + dx
+            if x < 0 or x >= GRID_WIDTH:
+                return None
+            gap = tops[x] - 1 - (piece.y + bottom)
+            if gap < 0:
+                return None
+            if gap < distance:
+                distance = gap
+        return distance
+
+    def _scan_drop_distance(self, piece):
+        distance = 0
+        while self.valid_position(piece, 0, distance + 1):
+            distance += 1
+        return distance
+
+    def hard_drop(self):
+        # 硬降（直接落到底部）
+        self.current_piece.y += self.drop_distance()
+        return self.lock_piece()
+
+    def hold_current_piece(self):
+        if not self.can_hold:
+            return False
+
+        if self.hold_piece is None:
+            self.hold_piece = self.current_piece
+            self.current_piece = self.next_piece
+            self.next_piece = self.new_piece()
+        else:
+            self.hold_piece, self.current_piece = self.current_piece, self.hold_piece
+            self.current_piece.x = GRID_WIDTH // 2 - 1
+            self.current_piece.y = 0
+
+        self.can_hold = False
+        return True
+
+    # -- rules -----------------------------------------------------------------
+
+    def place_piece(self, piece):
+        # write the piece into the board
+        for x, y in piece.cells():
+            pos_x = piece.x + x
+            pos_y = piece.y + y
+            if 0 <= pos_y < GRID_HEIGHT:
+                self.board[pos_y][pos_x] = piece.color_idx + 1
+                if pos_y < self.tops[pos_x]:
+                    self.tops[pos_x] = pos_y
+                self.on_cell_locked(pos_x, pos_y)
+        self.board_version += 1
+
+    def lock_piece(self):
+        # returns the number of cleared lines
+        self.place_piece(self.current_piece)
+        self.pieces_locked += 1
+
+        # 检查行消除
+        cleared = self.clear_lines()
+
+        # 生成新方块
+        self.current_piece = self.next_piece
+        self.next_piece = self.new_piece()
+        self.can_hold = True
+        self.fall_frames = 0
+
+        # 检查游戏结束
+        if not self.valid_position(self.current_piece):
+            self.game_over = True
+        return cleared
+
+    def full_rows(self):
+        return [y for y in range(GRID_HEIGHT) if all(self.board[y])]
+
+    def clear_lines(self):
+        lines_to_clear = self.full_rows()
+        if not lines_to_clear:
+            return 0
+
+        # 更新分数
+        cleared = len(lines_to_clear)
+        self.lines_cleared += cleared
+        self.score += LINE_SCORES[min(cleared - 1, 3)] * self.level
+
+        # 升级
+        self.level = self.lines_cleared // 10 + 1
+        self.fall_speed = fall_speed_for(self.level)
+
+        # 消除行
+        for line in lines_to_clear:
+            self.remove_line(line)
+            self.on_line_cleared(line)
+        return cleared
+
+    def remove_line(self, line):
+        # rows above the line move down by one, an empty row comes in at the top
+        del self.board[line]
+        self.board.insert(0, [0 for _ in range(GRID_WIDTH)])
+        self.board_version += 1
+        tops = self.tops
+        for x in range(GRID_WIDTH):
+            if tops[x] < line:
+                tops[x] += 1
+            elif tops[x] == line:
+                # the top block of this column was in the cleared line: next one below it
+                y = line + 1
+                while y < GRID_HEIGHT and not self.board[y][x]:
+                    y += 1
+                tops[x] = y
+
+    def gravity_frames(self):
+        # frames between two automatic one-row falls at the current level
+        return max(1, round(self.fall_speed * FPS))
+
+    def tick(self, frames=1):
+        # advance the clock; the piece falls one row every gravity_frames() frames and is
+        # locked when it cannot fall any more. returns the cleared lines
+        cleared = 0
+        for _ in range(frames):
+            if self.game_over:
+                break
+            self.frame += 1
+            self.fall_frames += 1
+            if self.fall_frames >= self.gravity_frames():
+                self.fall_frames = 0
+                if not self.soft_drop():
+                    cleared += self.lock_piece()
+        return cleared
+
+    def apply(self, action):
+        # one player action without advancing time; returns the cleared lines
+        if self.game_over or action == "noop":
+            return 0
+        if action == "left":
+            self.move(-1)
+        elif action == "right":
+            self.move(1)
+        elif action == "rotate":
+            self.rotate()
+        elif action == "soft_drop":
+            self.soft_drop()
+        elif action == "hard_drop":
+            return self.hard_drop()
+        elif action == "hold":
+            self.hold_current_piece()
+        else:
+            raise ValueError(f"unknown action {action!r}, expected one of {', '.join(ACTIONS)}")
+        return 0
+
+    def step(self, action="noop", frames=1):
+        # apply the action, then let `frames` frames pass (0: no gravity, for bots that only
+        # place pieces with hard_drop)
+        score, locked = self.score, self.pieces_locked
+        lines = self.apply(action)
+        lines += self.tick(frames)
+        return StepResult(self.score - score, lines, self.game_over, self.pieces_locked != locked)
+
+    # -- hooks for a front end (particles, sounds); nothing happens headless ---------------
+
+    def on_cell_locked(self, x, y):
+        pass
+
+    def on_line_cleared(self, y):
+        pass
+
+
+FULL_ROW = (1 << GRID_WIDTH) - 1
+
+
+def _row_masks(shape):
+    # bit x of a row mask is column x of the shape
+    return tuple(sum(1 << x for x, cell in enumerate(row) if cell) for row in shape)
+
+
+# PIECE_MASKS[shape_idx][rotation] = (row masks from the top of the shape, width); every
+# row and column of a shape has a cell, so the width and row count are the exact extent
+PIECE_MASKS = tuple(tuple((_row_masks(shape), len(shape[0])) for shape in rotations) for rotations in ROTATIONS)
+
+
+class BitboardEngine(TetrisEngine):
+    # same rules, but every board row is also kept as an integer bitmask (bit x = column x):
+    # a collision test is one AND per piece row, a full row is rows[y] == FULL_ROW.
+    # self.board still holds the colours for drawing and is only written when a piece locks.
+    # only helps search-style work that scans candidate positions row by row through
+    # valid_position (see bench_brick.py); play that drops pieces through drop_distance()
+    # (random bots, the game) is as fast or slower than with the plain engine
+    def reset(self, seed=None):
+        self.rows = [0] * GRID_HEIGHT
+        super().reset(seed)
+
+    def valid_position(self, piece, x_offset=0, y_offset=0):
+        masks, width = PIECE_MASKS[piece.shape_idx][piece.rotation & 3]
+        x = piece.x + x_offset
+        y = piece.y + y_offset
+        if x < 0 or x + width > GRID_WIDTH or y + len(masks) > GRID_HEIGHT:
+            return False
+        rows = self.rows
+        for i, mask in enumerate(masks):
+            if y + i >= 0 and rows[y + i] & (mask << x):
+                return False
+        return True
+
+    def place_piece(self, piece):
+        super().place_piece(piece)
+        masks, _ = PIECE_MASKS[piece.shape_idx][piece.rotation & 3]
+        for i, mask in enumerate(masks):
+            if 0 <= piece.y + i < GRID_HEIGHT:
+                self.rows[piece.y + i] |= mask << piece.x
+
+    def full_rows(self):
+        rows = self.rows
+        return [y for y in range(GRID_HEIGHT) if rows[y] == FULL_ROW]
+
+    def remove_line(self, line):
+        super().remove_line(line)
+        del self.rows[line]
+        self.rows.insert(0, 0)
+
+
+def random_bot_game(seed, max_pieces=1000, engine_class=None):
+    # 随机机器人：每个方块随机旋转、随机平移，然后硬降；returns the finished engine
+    engine = (engine_class or TetrisEngine)(seed)
+    rng = random.Random(seed)
+    while not engine.game_over and engine.pieces_locked < max_pieces:
+        for _ in range(rng.randint(0, 3)):
+            engine.apply("rotate")
+        shift = rng.randint(-5, 5)
+        for _ in range(abs(shift)):
+            engine.apply("left" if shift < 0 else "right")
+        engine.step("hard_drop", frames=0)
+    return engine
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="run headless random-bot games")
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", choices=("list", "bitboard"), default="list")
+    args = parser.parse_args()
+    engine_class = BitboardEngine if args.engine == "bitboard" else TetrisEngine
+
+    start = time.perf_counter()
+    pieces = score = 0
+    for game in range(args.games):
+        engine = random_bot_game(args.seed + game, engine_class=engine_class)
+        pieces += engine.pieces_locked
+        score += engine.score
+    elapsed = time.perf_counter() - start
+    print(f"{args.games} games, {pieces} pieces in {elapsed:.2f}s: "
+          f"{args.games / elapsed:.0f} games/s, {pieces / elapsed:.0f} pieces/s, mean score {score / args.games:.1f}")
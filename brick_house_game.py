@@ -4,16 +4,13 @@ import random
 import math
 import sys
 
-# 初始化pygame
-pygame.init()
-pygame.mixer.init()
+import brick_engine
+from brick_engine import FPS, GRID_HEIGHT, GRID_WIDTH, TetrisEngine
 
 # 游戏常量
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 700
 GRID_SIZE = 30
-GRID_WIDTH = 10
-GRID_HEIGHT = 20
 SIDEBAR_WIDTH = 250
 
 # 颜色定义
@@ -36,30 +33,35 @@ BLOCK_COLORS = [
     [(220, 70, 90), (190, 50, 70)]   # Red
 ]
 
-# 创建窗口
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("霓虹方块 - 俄罗斯方块")
-clock = pygame.time.Clock()
+# 窗口和字体在 init_display() 里创建，import 本模块不会打开窗口
+# (the rules live in brick_engine and run without any display)
+screen = None
+clock = None
+title_font = None
+font = None
+small_font = None
 
-# 字体
-# title_font = pygame.font.SysFont("Arial", 48, bold=True)
-# font = pygame.font.SysFont("Arial", 28)
-# small_font = pygame.font.SysFont("Arial", 20)
 
-title_font = pygame.font.SysFont('simhei', 48, bold=True)
-font = pygame.font.SysFont('simhei', 36)
-small_font = pygame.font.SysFont('simhei', 24)
+def init_display():
+    global screen, clock, title_font, font, small_font
+    # 初始化pygame
+    pygame.init()
+    pygame.mixer.init()
 
-# 方块形状定义
-SHAPES = [
-    [[1, 1, 1, 1]],  # I
-    [[1, 1, 1], [0, 1, 0]],  # T
-    [[1, 1, 1], [1, 0, 0]],  # L
-    [[1, 1, 1], [0, 0, 1]],  # J
-    [[1, 1], [1, 1]],  # O
-    [[0, 1, 1], [1, 1, 0]],  # S
-    [[1, 1, 0], [0, 1, 1]]  # Z
-]
+    # 创建窗口
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("霓虹方块 - 俄罗斯方块")
+    clock = pygame.time.Clock()
+
+    # 字体
+    # title_font = pygame.font.SysFont("Arial", 48, bold=True)
+    # font = pygame.font.SysFont("Arial", 28)
+    # small_font = pygame.font.SysFont("Arial", 20)
+
+    title_font = pygame.font.SysFont('simhei', 48, bold=True)
+    font = pygame.font.SysFont('simhei', 36)
+    small_font = pygame.font.SysFont('simhei', 24)
+    return screen
 
 class Particle:
     def __init__(self, x, y, color):
@@ -82,69 +84,50 @@ class Particle:
     def draw(self, surface):
         alpha = min(255, self.life * 6)
         color = (*self.color, int(alpha))
-        pygame.draw.circle(surface, color, (int(self.x), int(self.y)), int(self.size))
+        return pygame.draw.circle(surface, color, (int(self.x), int(self.y)), int(self.size))
 
-class Tetromino:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.shape_idx = random.randint(0, len(SHAPES) - 1)
-        self.shape = SHAPES[self.shape_idx]
-        self.color_idx = self.shape_idx
-        self.rotation = 0
+class Tetromino(brick_engine.Tetromino):
+    def __init__(self, x, y, shape_idx=None, rng=random):
+        super().__init__(x, y, shape_idx, rng)
         self.particles = []
-        
-    def rotate(self):
-        # 旋转矩阵 (90度顺时针)
-        rows = len(self.shape)
-        cols = len(self.shape[0])
-        rotated = [[0 for _ in range(rows)] for _ in range(cols)]
-        
-        for r in range(rows):
-            for c in range(cols):
-                rotated[c][rows - 1 - r] = self.shape[r][c]
-                
-        return rotated
     
-    def draw(self, surface, offset_x, offset_y, ghost=False):
-        shape = self.get_current_shape()
+    # at_y: draw at this row instead of self.y (the ghost piece)
+    def draw(self, surface, offset_x, offset_y, ghost=False, at_y=None):
         color_idx = self.color_idx
+        piece_y = self.y if at_y is None else at_y
         
-        for y, row in enumerate(shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    rect_x = offset_x + (self.x + x) * GRID_SIZE
-                    rect_y = offset_y + (self.y + y) * GRID_SIZE
+        for x, y in self.cells():
+            rect_x = offset_x + (self.x + x) * GRID_SIZE
+            rect_y = offset_y + (piece_y + y) * GRID_SIZE
                     
-                    if ghost:
-                        # 绘制半透明幽灵方块
-                        pygame.draw.rect(surface, (*BLOCK_COLORS[color_idx][0], 80), 
-                                        (rect_x, rect_y, GRID_SIZE, GRID_SIZE), 
-                                        border_radius=4)
-                        pygame.draw.rect(surface, BLOCK_COLORS[color_idx][0], 
-                                        (rect_x, rect_y, GRID_SIZE, GRID_SIZE), 
-                                        2, border_radius=4)
-                    else:
-                        # 绘制渐变方块
-                        pygame.draw.rect(surface, BLOCK_COLORS[color_idx][0], 
-                                        (rect_x, rect_y, GRID_SIZE, GRID_SIZE), 
-                                        border_radius=4)
-                        pygame.draw.rect(surface, BLOCK_COLORS[color_idx][1], 
-                                        (rect_x, rect_y, GRID_SIZE - 4, GRID_SIZE - 4), 
-                                        border_radius=3)
-                        # 高光效果
-                        pygame.draw.line(surface, (255, 255, 255, 100), 
-                                        (rect_x + 2, rect_y + 2), 
-                                        (rect_x + GRID_SIZE - 4, rect_y + 2), 1)
-                        pygame.draw.line(surface, (255, 255, 255, 100), 
-                                        (rect_x + 2, rect_y + 2), 
-                                        (rect_x + 2, rect_y + GRID_SIZE - 4), 1)
-    
-    def get_current_shape(self):
-        shape = self.shape
-        for _ in range(self.rotation % 4):
-            shape = self.rotate()
-        return shape
+            if ghost:
+                # 绘制半透明幽灵方块
+                pygame.draw.rect(surface, (*BLOCK_COLORS[color_idx][0], 80), 
+                                (rect_x, rect_y, GRID_SIZE, GRID_SIZE), 
+                                border_radius=4)
+                pygame.draw.rect(surface, BLOCK_COLORS[color_idx][0], 
+                                (rect_x, rect_y, GRID_SIZE, GRID_SIZE), 
+                                2, border_radius=4)
+            else:
+                # 绘制渐变方块
+                pygame.draw.rect(surface, BLOCK_COLORS[color_idx][0], 
+                                (rect_x, rect_y, GRID_SIZE, GRID_SIZE), 
+                                border_radius=4)
+                pygame.draw.rect(surface, BLOCK_COLORS[color_idx][1], 
+                                (rect_x, rect_y, GRID_SIZE - 4, GRID_SIZE - 4), 
+                                border_radius=3)
+                # 高光效果
+                pygame.draw.line(surface, (255, 255, 255, 100), 
+                                (rect_x + 2, rect_y + 2), 
+                                (rect_x + GRID_SIZE - 4, rect_y + 2), 1)
+                pygame.draw.line(surface, (255, 255, 255, 100), 
+                                (rect_x + 2, rect_y + 2), 
+                                (rect_x + 2, rect_y + GRID_SIZE - 4), 1)
+        
+        # 返回方块占的区域，用于局部刷新
+        width, height = self.bounds()
+        return pygame.Rect(offset_x + self.x * GRID_SIZE, offset_y + piece_y * GRID_SIZE,
+                           width * GRID_SIZE, height * GRID_SIZE)
     
     def add_particles(self, x, y, count=5):
         for _ in range(count):
@@ -160,101 +143,44 @@ class Tetromino:
         for particle in self.particles:
             particle.draw(surface)
 
-class TetrisGame:
-    def __init__(self):
-        self.reset()
+class TetrisGame(TetrisEngine):
+    piece_class = Tetromino
+
+    def __init__(self, seed=None):
         self.field_offset_x = (SCREEN_WIDTH - SIDEBAR_WIDTH - GRID_WIDTH * GRID_SIZE) // 2 + 20
         self.field_offset_y = 100
         self.particles = []
-        
-    def reset(self):
-        self.board = [[0 for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        self.current_piece = self.new_piece()
-        self.next_piece = self.new_piece()
-        self.game_over = False
-        self.score = 0
-        self.level = 1
-        self.lines_cleared = 0
-        self.fall_speed = 0.5  # 方块下落速度（秒）
-        self.fall_time = 0
-        self.hold_piece = None
-        self.can_hold = True
+        # 界面布局
+        self.board_rect = pygame.Rect(self.field_offset_x, self.field_offset_y,
+                                      GRID_WIDTH * GRID_SIZE, GRID_HEIGHT * GRID_SIZE)
+        self.label_positions = [("分数", 100), ("等级", 150), ("消除行", 200)]
+        self.next_rect = pygame.Rect(SCREEN_WIDTH - SIDEBAR_WIDTH + 40, 330, 150, 150)
+        self.hold_rect = pygame.Rect(SCREEN_WIDTH - SIDEBAR_WIDTH + 40, 580, 150, 150)
+        # 预渲染的静态层和场景层，第一次绘制时创建
+        self.static_layer = None
+        self.scene = None
+        super().__init__(seed)
+        
+    def reset(self, seed=None):
+        super().reset(seed)
         self.last_move_down_time = 0
-        
-    def new_piece(self):
-        return Tetromino(GRID_WIDTH // 2 - 1, 0)
+        self.invalidate()
     
-    def valid_position(self, piece, x_offset=0, y_offset=0):
-        shape = piece.get_current_shape()
-        for y, row in enumerate(shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    pos_x = piece.x + x + x_offset
-                    pos_y = piece.y + y + y_offset
-                    
-                    if (pos_x < 0 or pos_x >= GRID_WIDTH or 
-                        pos_y >= GRID_HEIGHT or 
-                        (pos_y >= 0 and self.board[pos_y][pos_x])):
-                        return False
-        return True
-    
-    def lock_piece(self):
-        shape = self.current_piece.get_current_shape()
-        for y, row in enumerate(shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    pos_x = self.current_piece.x + x
-                    pos_y = self.current_piece.y + y
-                    if 0 <= pos_y < GRID_HEIGHT:
-                        self.board[pos_y][pos_x] = self.current_piece.color_idx + 1
-                        # 添加锁定粒子效果
-                        self.add_particles(
-                            self.field_offset_x + pos_x * GRID_SIZE + GRID_SIZE // 2,
-                            self.field_offset_y + pos_y * GRID_SIZE + GRID_SIZE // 2
-                        )
-        
-        # 检查行消除
-        self.clear_lines()
-        
-        # 生成新方块
-        self.current_piece = self.next_piece
-        self.next_piece = self.new_piece()
-        self.can_hold = True
-        
-        # 检查游戏结束
-        if not self.valid_position(self.current_piece):
-            self.game_over = True
+    def on_cell_locked(self, x, y):
+        # 添加锁定粒子效果
+        self.add_particles(
+            self.field_offset_x + x * GRID_SIZE + GRID_SIZE // 2,
+            self.field_offset_y + y * GRID_SIZE + GRID_SIZE // 2
+        )
     
-    def clear_lines(self):
-        lines_to_clear = []
-        for y in range(GRID_HEIGHT):
-            if all(self.board[y]):
-                lines_to_clear.append(y)
-        
-        if not lines_to_clear:
-            return
-        
-        # 更新分数
-        cleared = len(lines_to_clear)
-        self.lines_cleared += cleared
-        self.score += [100, 300, 500, 800][min(cleared - 1, 3)] * self.level
-        
-        # 升级
-        self.level = self.lines_cleared // 10 + 1
-        self.fall_speed = max(0.05, 0.5 - (self.level - 1) * 0.05)
-        
-        # 消除行
-        for line in lines_to_clear:
-            del self.board[line]
-            self.board.insert(0, [0 for _ in range(GRID_WIDTH)])
-            
-            # 添加消除特效
-            for x in range(GRID_WIDTH):
-                self.add_particles(
-                    self.field_offset_x + x * GRID_SIZE + GRID_SIZE // 2,
-                    self.field_offset_y + line * GRID_SIZE + GRID_SIZE // 2,
-                    count=10
-                )
+    def on_line_cleared(self, line):
+        # 添加消除特效
+        for x in range(GRID_WIDTH):
+            self.add_particles(
+                self.field_offset_x + x * GRID_SIZE + GRID_SIZE // 2,
+                self.field_offset_y + line * GRID_SIZE + GRID_SIZE // 2,
+                count=10
+            )
     
     def add_particles(self, x, y, count=5):
         for _ in range(count):
@@ -270,160 +196,49 @@ class TetrisGame:
         for particle in self.particles:
             particle.draw(surface)
     
-    def hold_current_piece(self):
-        if not self.can_hold:
-            return
-            
-        if self.hold_piece is None:
-            self.hold_piece = self.current_piece
-            self.current_piece = self.next_piece
-            self.next_piece = self.new_piece()
-        else:
-            self.hold_piece, self.current_piece = self.current_piece, self.hold_piece
-            self.current_piece.x = GRID_WIDTH // 2 - 1
-            self.current_piece.y = 0
+    def build_static_layer(self, surface):
+        # 不随游戏变化的部分只画一次：背景网格、游戏区边框和空格子、侧边栏面板、文字和标题
+        layer = pygame.Surface(surface.get_size()).convert(surface)
+        layer.fill(BACKGROUND)
         
-        self.can_hold = False
-    
-    def draw_board(self, surface):
-        # 绘制游戏区域背景
-        board_rect = pygame.Rect(
-            self.field_offset_x - 10,
-            self.field_offset_y - 10,
-            GRID_WIDTH * GRID_SIZE + 20,
-            GRID_HEIGHT * GRID_SIZE + 20
-        )
-        pygame.draw.rect(surface, GRID_BORDER, board_rect, border_radius=8)
-        pygame.draw.rect(surface, BACKGROUND, board_rect.inflate(-4, -4), border_radius=6)
+        # 网格背景
+        for y in range(0, SCREEN_HEIGHT, 40):
+            for x in range(0, SCREEN_WIDTH, 40):
+                pygame.draw.rect(layer, GRID_COLOR, (x, y, 38, 38), 1)
         
-        # 绘制网格
+        # 游戏区域背景和空格子
+        border_rect = self.board_rect.inflate(20, 20)
+        pygame.draw.rect(layer, GRID_BORDER, border_rect, border_radius=8)
+        pygame.draw.rect(layer, BACKGROUND, border_rect.inflate(-4, -4), border_radius=6)
         for y in range(GRID_HEIGHT):
             for x in range(GRID_WIDTH):
-                rect = pygame.Rect(
-                    self.field_offset_x + x * GRID_SIZE,
-                    self.field_offset_y + y * GRID_SIZE,
-                    GRID_SIZE, GRID_SIZE
-                )
-                pygame.draw.rect(surface, GRID_COLOR, rect, 1)
-                
-                # 绘制已放置的方块
-                if self.board[y][x]:
-                    color_idx = self.board[y][x] - 1
-                    pygame.draw.rect(surface, BLOCK_COLORS[color_idx][0], rect, border_radius=4)
-                    pygame.draw.rect(surface, BLOCK_COLORS[color_idx][1], rect.inflate(-8, -8), border_radius=3)
-        
-        # 绘制幽灵方块（预览位置）
-        ghost_y = self.current_piece.y
-        while self.valid_position(self.current_piece, 0, ghost_y + 1 - self.current_piece.y):
-            ghost_y += 1
-        ghost = Tetromino(self.current_piece.x, ghost_y)
-        ghost.shape_idx = self.current_piece.shape_idx
-        ghost.color_idx = self.current_piece.color_idx
-        ghost.rotation = self.current_piece.rotation
-        ghost.draw(surface, self.field_offset_x, self.field_offset_y, ghost=True)
+                pygame.draw.rect(layer, GRID_COLOR, self.cell_rect(x, y), 1)
         
-        # 绘制当前方块
-        self.current_piece.draw(surface, self.field_offset_x, self.field_offset_y)
-    
-    def draw_sidebar(self, surface):
-        # 绘制信息面板
+        # 信息面板
         panel_rect = pygame.Rect(
             SCREEN_WIDTH - SIDEBAR_WIDTH + 20,
             self.field_offset_y - 10,
             SIDEBAR_WIDTH - 40,
             SCREEN_HEIGHT - self.field_offset_y - 20
         )
-        pygame.draw.rect(surface, PANEL_BORDER, panel_rect, border_radius=10)
-        pygame.draw.rect(surface, PANEL_BG, panel_rect.inflate(-4, -4), border_radius=8)
+        pygame.draw.rect(layer, PANEL_BORDER, panel_rect, border_radius=10)
+        pygame.draw.rect(layer, PANEL_BG, panel_rect.inflate(-4, -4), border_radius=8)
         
-        # 标题
         title = title_font.render("霓虹方块", True, HIGHLIGHT_COLOR)
-        surface.blit(title, (SCREEN_WIDTH - SIDEBAR_WIDTH + 20 + (SIDEBAR_WIDTH - 40 - title.get_width()) // 2, 20))
-        
-        # 分数信息
-        y_offset = 100
-        labels = [
-            ("分数", self.score),
-            ("等级", self.level),
-            ("消除行", self.lines_cleared)
-        ]
-        
-        for label, value in labels:
-            text = font.render(f"{label}:", True, TEXT_COLOR)
-            value_text = font.render(str(value), True, HIGHLIGHT_COLOR)
-            surface.blit(text, (SCREEN_WIDTH - SIDEBAR_WIDTH + 40, y_offset))
-            surface.blit(value_text, (SCREEN_WIDTH - SIDEBAR_WIDTH + 40 + 120, y_offset))
-            y_offset += 50
-        
-        # 下一个方块预览
-        y_offset += 30
-        next_label = font.render("下一个:", True, TEXT_COLOR)
-        surface.blit(next_label, (SCREEN_WIDTH - SIDEBAR_WIDTH + 40, y_offset))
-        y_offset += 50
-        
-        preview_rect = pygame.Rect(
-            SCREEN_WIDTH - SIDEBAR_WIDTH + 40,
-            y_offset,
-            150,
-            150
-        )
-        pygame.draw.rect(surface, GRID_BORDER, preview_rect, border_radius=8)
-        pygame.draw.rect(surface, PANEL_BG, preview_rect.inflate(-4, -4), border_radius=6)
-        
-        # 绘制下一个方块
-        shape = self.next_piece.get_current_shape()
-        shape_width = len(shape[0]) * GRID_SIZE
-        shape_height = len(shape) * GRID_SIZE
-        start_x = preview_rect.centerx - shape_width // 2
-        start_y = preview_rect.centery - shape_height // 2
-        
-        for y, row in enumerate(shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    rect = pygame.Rect(
-                        start_x + x * GRID_SIZE,
-                        start_y + y * GRID_SIZE,
-                        GRID_SIZE, GRID_SIZE
-                    )
-                    pygame.draw.rect(surface, BLOCK_COLORS[self.next_piece.color_idx][0], rect, border_radius=4)
-                    pygame.draw.rect(surface, BLOCK_COLORS[self.next_piece.color_idx][1], rect.inflate(-8, -8), border_radius=3)
-        
-        # Hold 方块预览
-        y_offset += 200
-        hold_label = font.render("保留:", True, TEXT_COLOR)
-        surface.blit(hold_label, (SCREEN_WIDTH - SIDEBAR_WIDTH + 40, y_offset))
-        y_offset += 50
+        layer.blit(title, (SCREEN_WIDTH - SIDEBAR_WIDTH + 20 + (SIDEBAR_WIDTH - 40 - title.get_width()) // 2, 20))
         
-        hold_rect = pygame.Rect(
-            SCREEN_WIDTH - SIDEBAR_WIDTH + 40,
-            y_offset,
-            150,
-            150
-        )
-        pygame.draw.rect(surface, GRID_BORDER, hold_rect, border_radius=8)
-        pygame.draw.rect(surface, PANEL_BG, hold_rect.inflate(-4, -4), border_radius=6)
+        # 分数标签（数值在 draw_values 里画）
+        for label, y_offset in self.label_positions:
+            layer.blit(font.render(f"{label}:", True, TEXT_COLOR), (SCREEN_WIDTH - SIDEBAR_WIDTH + 40, y_offset))
         
-        # 绘制保留的方块
-        if self.hold_piece:
-            shape = self.hold_piece.get_current_shape()
-            shape_width = len(shape[0]) * GRID_SIZE
-            shape_height = len(shape) * GRID_SIZE
-            start_x = hold_rect.centerx - shape_width // 2
-            start_y = hold_rect.centery - shape_height // 2
-            
-            for y, row in enumerate(shape):
-                for x, cell in enumerate(row):
-                    if cell:
-                        rect = pygame.Rect(
-                            start_x + x * GRID_SIZE,
-                            start_y + y * GRID_SIZE,
-                            GRID_SIZE, GRID_SIZE
-                        )
-                        pygame.draw.rect(surface, BLOCK_COLORS[self.hold_piece.color_idx][0], rect, border_radius=4)
-                        pygame.draw.rect(surface, BLOCK_COLORS[self.hold_piece.color_idx][1], rect.inflate(-8, -8), border_radius=3)
+        # 下一个 / 保留 预览框
+        for label, rect in (("下一个:", self.next_rect), ("保留:", self.hold_rect)):
+            layer.blit(font.render(label, True, TEXT_COLOR), (rect.x, rect.y - 50))
+            pygame.draw.rect(layer, GRID_BORDER, rect, border_radius=8)
+            pygame.draw.rect(layer, PANEL_BG, rect.inflate(-4, -4), border_radius=6)
         
         # 操作说明
-        y_offset += 200
+        y_offset = self.hold_rect.y + 200
         controls = [
             "←→ : 左右移动",
             "↑ : 旋转",
@@ -436,8 +251,96 @@ class TetrisGame:
         
         for control in controls:
             text = small_font.render(control, True, TEXT_COLOR)
-            surface.blit(text, (SCREEN_WIDTH - SIDEBAR_WIDTH + 40, y_offset))
+            layer.blit(text, (SCREEN_WIDTH - SIDEBAR_WIDTH + 40, y_offset))
             y_offset += 30
+        
+        # 标题不放进静态层：它要画在粒子和结束画面上面，见 render
+        self.title = title_font.render("俄罗斯方块", True, (255, 255, 255))
+        self.title_rect = self.title.get_rect(midtop=(SCREEN_WIDTH // 2, 20))
+        return layer
+    
+    def cell_rect(self, x, y):
+        return pygame.Rect(
+            self.field_offset_x + x * GRID_SIZE,
+            self.field_offset_y + y * GRID_SIZE,
+            GRID_SIZE, GRID_SIZE
+        )
+    
+    def invalidate(self):
+        # 下一次 render 整屏重画
+        self.drawn_rows = [None] * GRID_HEIGHT
+        self.drawn_values = {}
+        self.drawn_previews = None
+        self.drawn_sprites = None
+        self.sprite_rects = []
+        self.drawn_game_over = False
+        self.full_redraw = True
+    
+    def draw_rows(self):
+        # 已锁定的方块：只重画内容变了的行
+        dirty = []
+        for y in range(GRID_HEIGHT):
+            row = tuple(self.board[y])
+            if row == self.drawn_rows[y]:
+                continue
+            self.drawn_rows[y] = row
+            row_rect = pygame.Rect(self.field_offset_x, self.field_offset_y + y * GRID_SIZE,
+                                   GRID_WIDTH * GRID_SIZE, GRID_SIZE)
+            self.scene.blit(self.static_layer, row_rect, row_rect)
+            for x, cell in enumerate(row):
+                if cell:
+                    rect = self.cell_rect(x, y)
+                    pygame.draw.rect(self.scene, BLOCK_COLORS[cell - 1][0], rect, border_radius=4)
+                    pygame.draw.rect(self.scene, BLOCK_COLORS[cell - 1][1], rect.inflate(-8, -8), border_radius=3)
+            dirty.append(row_rect)
+        return dirty
+    
+    def draw_values(self):
+        dirty = []
+        values = (self.score, self.level, self.lines_cleared)
+        for (label, y_offset), value in zip(self.label_positions, values):
+            old = self.drawn_values.get(label)
+            if old is not None and old[0] == value:
+                continue
+            value_text = font.render(str(value), True, HIGHLIGHT_COLOR)
+            rect = value_text.get_rect(topleft=(SCREEN_WIDTH - SIDEBAR_WIDTH + 40 + 120, y_offset))
+            changed = rect if old is None else rect.union(old[1])
+            self.scene.blit(self.static_layer, changed, changed)
+            self.scene.blit(value_text, rect)
+            self.drawn_values[label] = (value, rect)
+            dirty.append(changed)
+        return dirty
+    
+    def draw_previews(self):
+        hold = self.hold_piece
+        key = (self.next_piece, self.next_piece.rotation, hold, hold.rotation if hold else None)
+        if key == self.drawn_previews:
+            return []
+        self.drawn_previews = key
+        for piece, box in ((self.next_piece, self.next_rect), (hold, self.hold_rect)):
+            self.scene.blit(self.static_layer, box, box)
+            if piece is None:
+                continue
+            width, height = piece.bounds()
+            start_x = box.centerx - width * GRID_SIZE // 2
+            start_y = box.centery - height * GRID_SIZE // 2
+            for x, y in piece.cells():
+                rect = pygame.Rect(start_x + x * GRID_SIZE, start_y + y * GRID_SIZE, GRID_SIZE, GRID_SIZE)
+                pygame.draw.rect(self.scene, BLOCK_COLORS[piece.color_idx][0], rect, border_radius=4)
+                pygame.draw.rect(self.scene, BLOCK_COLORS[piece.color_idx][1], rect.inflate(-8, -8), border_radius=3)
+        return [self.next_rect, self.hold_rect]
+    
+    def draw_sprites(self, surface):
+        # 会动的部分直接画在屏幕上：幽灵方块、当前方块、粒子；返回它们占的区域
+        piece = self.current_piece
+        ghost_y = piece.y + self.drop_distance()
+        rects = [
+            piece.draw(surface, self.field_offset_x, self.field_offset_y, ghost=True, at_y=ghost_y),
+            piece.draw(surface, self.field_offset_x, self.field_offset_y),
+        ]
+        for particle in self.particles:
+            rects.append(particle.draw(surface))
+        return rects
     
     def draw_game_over(self, surface):
         overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
@@ -452,36 +355,74 @@ class TetrisGame:
         surface.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, SCREEN_HEIGHT // 2 + 10))
         surface.blit(restart_text, (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, SCREEN_HEIGHT // 2 + 70))
     
-    def draw(self, surface):
-        # 绘制背景
-        surface.fill(BACKGROUND)
-        
-        # 绘制网格背景
-        for y in range(0, SCREEN_HEIGHT, 40):
-            for x in range(0, SCREEN_WIDTH, 40):
-                pygame.draw.rect(surface, GRID_COLOR, (x, y, 38, 38), 1)
-        
-        # 绘制游戏区域
-        self.draw_board(surface)
-        
-        # 绘制侧边栏
-        self.draw_sidebar(surface)
+    def render(self, surface):
+        # 增量绘制：静态层只画一次，场景层（静态层 + 已锁定方块 + 分数 + 预览）只改变了的地方重画，
+        # 屏幕上只擦掉、重画会动的部分。返回这一帧变化的区域，交给 pygame.display.update
+        if self.static_layer is None:
+            self.static_layer = self.build_static_layer(surface)
+            self.scene = self.static_layer.copy()
+        dirty = self.draw_rows() + self.draw_values() + self.draw_previews()
         
-        # 绘制粒子效果
-        self.draw_particles(surface)
-        
-        # 游戏结束画面
         if self.game_over:
+            # 结束画面不再变化，画一次就够了
+            if self.drawn_game_over:
+                return []
+            surface.blit(self.scene, (0, 0))
+            self.draw_sprites(surface)
             self.draw_game_over(surface)
+            surface.blit(self.title, self.title_rect)
+            self.drawn_game_over = True
+            self.full_redraw = False
+            return [surface.get_rect()]
+        
+        if self.full_redraw:
+            surface.blit(self.scene, (0, 0))
+        for rect in dirty:
+            surface.blit(self.scene, rect, rect)
+        
+        piece = self.current_piece
+        sprites = (piece, piece.x, piece.y, piece.rotation, self.board_version)
+        if (self.full_redraw or dirty or self.particles or sprites != self.drawn_sprites
+                or len(self.sprite_rects) > 2):
+            # 擦掉上一帧的方块和粒子再重画
+            for rect in self.sprite_rects:
+                surface.blit(self.scene, rect, rect)
+            dirty += self.sprite_rects
+            self.sprite_rects = self.draw_sprites(surface)
+            dirty += self.sprite_rects
+            self.drawn_sprites = sprites
         
         # 标题
-        title = title_font.render("俄罗斯方块", True, (255, 255, 255))
-        surface.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 20))
+        if self.full_redraw or self.title_rect.collidelist(dirty) != -1:
+            surface.blit(self.title, self.title_rect)
+        
+        if self.full_redraw:
+            self.full_redraw = False
+            return [surface.get_rect()]
+        return dirty
+    
+    def draw(self, surface):
+        # 整屏重画（暂停画面等用）
+        self.invalidate()
+        self.render(surface)
+
+# 按键 -> 引擎动作
+KEY_ACTIONS = {
+    pygame.K_LEFT: "left",
+    pygame.K_RIGHT: "right",
+    pygame.K_UP: "rotate",       # 旋转
+    pygame.K_DOWN: "soft_drop",  # 加速下落
+    pygame.K_SPACE: "hard_drop", # 硬降（直接落到底部）
+    pygame.K_c: "hold",
+}
 
 def main():
+    init_display()
     game = TetrisGame()
     last_time = pygame.time.get_ticks()
+    pending_time = 0.0
     paused = False
+    pause_drawn = False
     
     while True:
         current_time = pygame.time.get_ticks()
@@ -504,58 +445,42 @@ def main():
                 if event.key == pygame.K_p:
                     paused = not paused
                 
-                if not paused and not game.game_over:
-                    if event.key == pygame.K_LEFT:
-                        if game.valid_position(game.current_piece, -1):
-                            game.current_piece.x -= 1
-                    elif event.key == pygame.K_RIGHT:
-                        if game.valid_position(game.current_piece, 1):
-                            game.current_piece.x += 1
-                    elif event.key == pygame.K_UP:
-                        # 旋转
-                        game.current_piece.rotation += 1
-                        if not game.valid_position(game.current_piece):
-                            game.current_piece.rotation -= 1
-                    elif event.key == pygame.K_DOWN:
-                        # 加速下落
-                        if game.valid_position(game.current_piece, 0, 1):
-                            game.current_piece.y += 1
-                    elif event.key == pygame.K_SPACE:
-                        # 硬降（直接落到底部）
-                        while game.valid_position(game.current_piece, 0, 1):
-                            game.current_piece.y += 1
-                        game.lock_piece()
-                    elif event.key == pygame.K_c:
-                        game.hold_current_piece()
+                if event.key in (pygame.K_r, pygame.K_p):
+                    pause_drawn = False
+                
+                if not paused and not game.game_over and event.key in KEY_ACTIONS:
+                    game.apply(KEY_ACTIONS[event.key])
         
         # 游戏逻辑更新
         if not paused and not game.game_over:
-            game.fall_time += delta_time
-            
-            # 方块自动下落
-            if game.fall_time >= game.fall_speed:
-                game.fall_time = 0
-                if game.valid_position(game.current_piece, 0, 1):
-                    game.current_piece.y += 1
-                    game.last_move_down_time = current_time
-                else:
-                    game.lock_piece()
+            # 方块自动下落：真实时间换算成引擎的帧数
+            pending_time += delta_time
+            frames = int(pending_time * FPS)
+            pending_time -= frames / FPS
+            game.tick(frames)
             
             # 更新粒子
             game.update_particles()
         
-        # 绘制
-        game.draw(screen)
-        
-        # 暂停显示
+        # 绘制：只刷新变化的区域
         if paused:
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 150))
-            screen.blit(overlay, (0, 0))
-            paused_text = title_font.render("游戏暂停", True, (255, 255, 255))
-            screen.blit(paused_text, (SCREEN_WIDTH // 2 - paused_text.get_width() // 2, SCREEN_HEIGHT // 2 - 30))
-        
-        pygame.display.update()
+            # 暂停画面不变，画一次就够了
+            if not pause_drawn:
+                game.draw(screen)
+                overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+                overlay.fill((0, 0, 0, 150))
+                screen.blit(overlay, (0, 0))
+                paused_text = title_font.render("游戏暂停", True, (255, 255, 255))
+                screen.blit(paused_text, (SCREEN_WIDTH // 2 - paused_text.get_width() // 2, SCREEN_HEIGHT // 2 - 30))
+                pygame.display.update()
+                pause_drawn = True
+        else:
+            if pause_drawn:
+                game.invalidate()
+                pause_drawn = False
+            dirty = game.render(screen)
+            if dirty:
+                pygame.display.update(dirty)
         clock.tick(60)
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+# canonical zodiac / MBTI keys
+# "天蝎座", "天蝎", "天蠍座", "Scorpio", "sco" and "♏" are one sign, "infp", "INFP-T" and
+# "调停者" one type. every input is mapped onto one of the 12 x 16 = 192 canonical
+# (sign, type) pairs before it reaches the prompt or the cache key, so all spellings share
+# one cached reading; anything else is rejected instead of being sent to the model.
+import unicodedata
+
+# canonical name, then aliases (English name, abbreviation, symbol, variant characters)
+SIGNS = (
+    ("白羊座", "Aries", "ari", "♈", "牡羊座"),
+    ("金牛座", "Taurus", "tau", "♉"),
+    ("双子座", "Gemini", "gem", "♊", "雙子座"),
+    ("巨蟹座", "Cancer", "can", "♋"),
+    ("狮子座", "Leo", "♌", "獅子座"),
+    ("处女座", "Virgo", "vir", "♍", "處女座", "室女座"),
+    ("天秤座", "Libra", "lib", "♎", "天平座"),
+    ("天蝎座", "Scorpio", "Scorpius", "sco", "♏", "天蠍座"),
+    ("射手座", "Sagittarius", "sag", "♐", "人马座", "人馬座"),
+    ("摩羯座", "Capricorn", "Capricornus", "cap", "♑", "山羊座", "魔羯座"),
+    ("水瓶座", "Aquarius", "aqu", "♒", "宝瓶座", "寶瓶座"),
+    ("双鱼座", "Pisces", "pis", "♓", "雙魚座"),
+)
+
+# the 16 types with their common Chinese role names
+MBTI_TYPES = (
+    ("INTJ", "建筑师"), ("INTP", "逻辑学家"), ("ENTJ", "指挥官"), ("ENTP", "辩论家"),
+    ("INFJ", "提倡者"), ("INFP", "调停者"), ("ENFJ", "主人公"), ("ENFP", "竞选者"),
+    ("ISTJ", "物流师"), ("ISFJ", "守卫者"), ("ESTJ", "总经理"), ("ESFJ", "执政官"),
+    ("ISTP", "鉴赏家"), ("ISFP", "探险家"), ("ESTP", "企业家"), ("ESFP", "表演者"),
+)
+
+# assertive / turbulent identity suffixes of the 16personalities variant
+MBTI_SUFFIXES = ("", "-A", "-T", "A", "T", "_A", "_T", "(A)", "(T)")
+
+CANONICAL_SIGNS = tuple(sign[0] for sign in SIGNS)
+CANONICAL_TYPES = tuple(code for code, _ in MBTI_TYPES)
+CANONICAL_KEYS = tuple((sign, code) for sign in CANONICAL_SIGNS for code in CANONICAL_TYPES)
+
+
+class InvalidInput(ValueError):
+    def __init__(self, kind, value, suggestions=()):
+        message = f"unknown {kind} {value!r}"
+        if suggestions:
+            message += f", did you mean {' / '.join(suggestions)}?"
+        super().__init__(message)
+        self.kind = kind
+        self.value = value
+        self.suggestions = list(suggestions)
+
+
+def _fold(text):
+    # full-width letters, stray spaces and case do not matter
+    return "".join(unicodedata.normalize("NFKC", text).split()).casefold()
+
+
+def _build_sign_index():
+    index = {}
+    for canonical, *aliases in SIGNS:
+        for name in (canonical, *aliases):
+            index[_fold(name)] = canonical
+            if name.endswith("座"):
+                index[_fold(name[:-1])] = canonical
+    return index
+
+
+def _build_type_index():
+    index = {}
+    for code, role in MBTI_TYPES:
+        for suffix in MBTI_SUFFIXES:
+            index[_fold(code + suffix)] = code
+        index[_fold(role)] = code
+    return index
+
+
+SIGN_INDEX = _build_sign_index()
+TYPE_INDEX = _build_type_index()
+
+
+def _lookup(index, kind, value):
+    if not isinstance(value, str):
+        raise InvalidInput(kind, value)
+    found = index.get(_fold(value))
+    if found is None:
+        import difflib
+        matches = difflib.get_close_matches(_fold(value), list(index), n=3, cutoff=0.6)
+        suggestions = list(dict.fromkeys(index[match] for match in matches))
+        raise InvalidInput(kind, value, suggestions)
+    return found
+
+
+def canonical_sign(value):
+    return _lookup(SIGN_INDEX, "zodiac sign", value)
+
+
+def canonical_type(value):
+    return _lookup(TYPE_INDEX, "MBTI type", value)
+
+
+def canonical_key(zodiac, mbti):
+    # ("Scorpio", "infp-t") -> ("天蝎座", "INFP"); raises InvalidInput for anything else
+    return canonical_sign(zodiac), canonical_type(mbti)
@@ -0,0 +1,348 @@
+# record / replay of model calls
+# a CassetteClient stands in for ollama_client.OllamaClient. in "record" mode it passes every
+# call through to the real client and appends request + response to a cassette file, with the
+# arrival time of every streamed part; in "replay" mode it answers from the cassette without
+# a server, either instantly or at the recorded pace. tests, demos and benchmarks of fate_ai
+# and coverletter_ai then run offline, in milliseconds and with the same output every time.
+#
+#   model = DeepSeekR1Model(client=CassetteClient("tests/readings.jsonl.gz", mode="replay"))
+#   ZODIAC_CASSETTE=demo.jsonl.gz ZODIAC_CASSETTE_MODE=record python zodiac.py analyze 天蝎座 INFP
+#
+# the file has one JSON object per call (gzip-compressed when the name ends in .gz). a streamed
+# response is stored as [milliseconds since the previous part, text] pairs plus the final part;
+# replayed responses are plain dicts, indexed like the ollama response objects.
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+MODES = ("record", "replay", "auto")
+
+# request arguments that change the answer; keep_alive and the like only change the transport
+_KEY_FIELDS = ("messages", "prompt", "system", "template", "context", "format", "options", "think",
+               "raw", "images", "tools", "suffix")
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+def request_key(op, model, request):
+    fields = {name: request[name] for name in _KEY_FIELDS if request.get(name) is not None}
+    raw = json.dumps([op, model, fields], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def _as_dict(response):
+    if hasattr(response, "model_dump"):
+        return response.model_dump(exclude_none=True)
+    return dict(response)
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class Cassette:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}        # key -> recorded calls, replayed in order
+        self._cursor = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with _open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue        # a line cut short while recording
+                    self.entries.setdefault(entry["key"], []).append(entry)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
+    def next(self, key, op="", model=""):
+        # the same request recorded several times is replayed in the recorded order; after the
+        # last recording the last one repeats
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"{self.path} has no recording of this {op} request to {model} (key {key})")
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            return entries[min(index, len(entries) - 1)]
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self.entries.setdefault(entry["key"], []).append(entry)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            # gzip members can be concatenated, so appending works for .gz files as well
+            with _open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+class CassetteClient:
+    # mode: "record" calls the model and records, "replay" only answers from the cassette
+    # (CassetteMiss for an unknown request), "auto" replays what it has and records the rest
+    # pace: 0 replays instantly, 1.0 at the recorded speed, 0.5 twice as fast
+    # inner: the client that does the real calls when recording, the shared one by default
+    def __init__(self, path, mode="replay", inner=None, pace=0.0):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.cassette = Cassette(path)
+        self.mode = mode
+        self.pace = pace
+        self._inner = inner
+        self.keep_alive = getattr(inner, "keep_alive", None)
+
+    @property
+    def inner(self):
+        if self._inner is None:
+            from ollama_client import OllamaClient
+            self._inner = OllamaClient()
+        return self._inner
+
+    def _replaying(self, key):
+        return self.mode == "replay" or (self.mode == "auto" and key in self.cassette)
+
+    # -- the OllamaClient interface ----------------------------------------------
+
+    def chat(self, model, messages, stream=False, **kwargs):
+        return self._call("chat", model, stream, dict(kwargs, messages=messages))
+
+    async def achat(self, model, messages, stream=False, **kwargs):
+        return await self._acall("chat", model, stream, dict(kwargs, messages=messages))
+
+    def generate(self, model, prompt, stream=False, **kwargs):
+        return self._call("generate", model, stream, dict(kwargs, prompt=prompt))
+
+    async def agenerate(self, model, prompt, stream=False, **kwargs):
+        return await self._acall("generate", model, stream, dict(kwargs, prompt=prompt))
+
+    def warm_up(self, model):
+        return 0.0 if self.mode == "replay" else self.inner.warm_up(model)
+
+    async def awarm_up(self, model):
+        return 0.0 if self.mode == "replay" else await self.inner.awarm_up(model)
+
+    def unload(self, model):
+        if self.mode != "replay":
+            self.inner.unload(model)
+
+    def close(self):
+        if self._inner is not None:
+            self._inner.close()
+
+    # -- replay ------------------------------------------------------------------
+
+    def _call(self, op, model, stream, request):
+        key = request_key(op, model, request)
+        if not self._replaying(key):
+            return self._record(op, model, stream, request, key)
+        entry = self.cassette.next(key, op, model)
+        if stream:
+            return self._replay_stream(op, entry)
+        self._sleep_sync(_duration(entry))
+        return self._response(entry)
+
+    async def _acall(self, op, model, stream, request):
+        key = request_key(op, model, request)
+        if not self._replaying(key):
+            return await self._arecord(op, model, stream, request, key)
+        entry = self.cassette.next(key, op, model)
+        if stream:
+            return self._areplay_stream(op, entry)
+        await self._sleep_async(_duration(entry))
+        return self._response(entry)
+
+    def _response(self, entry):
+        _raise_recorded(entry)
+        if "response" in entry:
+            return entry["response"]
+        # recorded streamed, asked for in one piece
+        text = "".join(text for _, text in entry["parts"])
+        response = dict(entry["final"])
+        if entry["op"] == "chat":
+            response["message"] = dict(response.get("message") or {"role": "assistant"}, content=text)
+        else:
+            response["response"] = text
+        return response
+
+    def _parts(self, op, entry):
+        # (delay in seconds, part) for every streamed part of the entry
+        if "response" in entry:
+            # recorded in one piece, asked for as a stream
+            yield entry.get("elapsed", 0.0), entry["response"]
+            return
+        model = entry["model"]
+        for delay_ms, text in entry["parts"]:
+            if op == "chat":
+                part = {"model": model, "message": {"role": "assistant", "content": text}, "done": False}
+            else:
+                part = {"model": model, "response": text, "done": False}
+            yield delay_ms / 1000, part
+        if "final" in entry:
+            yield entry.get("final_delay_ms", 0) / 1000, entry["final"]
+
+    def _replay_stream(self, op, entry):
+        for delay, part in self._parts(op, entry):
+            self._sleep_sync(delay)
+            yield part
+        _raise_recorded(entry)
+
+    async def _areplay_stream(self, op, entry):
+        for delay, part in self._parts(op, entry):
+            await self._sleep_async(delay)
+            yield part
+        _raise_recorded(entry)
+
+    def _sleep_sync(self, seconds):
+        if self.pace and seconds > 0:
+            time.sleep(seconds * self.pace)
+
+    async def _sleep_async(self, seconds):
+        if self.pace and seconds > 0:
+            import asyncio
+            await asyncio.sleep(seconds * self.pace)
+
+    # -- record ------------------------------------------------------------------
+
+    def _entry(self, op, model, request, key):
+        messages = request.get("messages")
+        return {"key": key, "op": op, "model": model,
+                # kept for people reading the cassette, not used for matching
+                "request": messages[-1]["content"][:200] if messages else str(request.get("prompt", ""))[:200]}
+
+    def _record(self, op, model, stream, request, key):
+        method = getattr(self.inner, op)
+        entry = self._entry(op, model, request, key)
+        start = time.perf_counter()
+        if stream:
+            return self._record_stream(op, entry, start, method(model, _arg(op, request), stream=True,
+                                                                **_rest(op, request)))
+        try:
+            response = method(model, _arg(op, request), **_rest(op, request))
+        except Exception as exc:
+            self._record_error(entry, exc, start)
+            raise
+        entry["elapsed"] = round(time.perf_counter() - start, 4)
+        entry["response"] = _as_dict(response)
+        self.cassette.append(entry)
+        return response
+
+    async def _arecord(self, op, model, stream, request, key):
+        method = getattr(self.inner, "a" + op)
+        entry = self._entry(op, model, request, key)
+        start = time.perf_counter()
+        if stream:
+            parts = await method(model, _arg(op, request), stream=True, **_rest(op, request))
+            return self._arecord_stream(op, entry, start, parts)
+        try:
+            response = await method(model, _arg(op, request), **_rest(op, request))
+        except Exception as exc:
+            self._record_error(entry, exc, start)
+            raise
+        entry["elapsed"] = round(time.perf_counter() - start, 4)
+        entry["response"] = _as_dict(response)
+        self.cassette.append(entry)
+        return response
+
+    def _record_error(self, entry, exc, start):
+        # server errors are part of the conversation (ChatSession falls back on them)
+        if type(exc).__name__ == "ResponseError":
+            entry["elapsed"] = round(time.perf_counter() - start, 4)
+            entry["parts"] = []
+            entry["error"] = {"message": str(getattr(exc, "error", exc)),
+                              "status": getattr(exc, "status_code", -1)}
+            self.cassette.append(entry)
+
+    def _record_stream(self, op, entry, start, parts):
+        recorder = _StreamRecorder(op, entry, start)
+        try:
+            for part in parts:
+                recorder.add(part)
+                yield part
+        except Exception as exc:
+            self._record_error(dict(entry, parts=recorder.parts), exc, start)
+            raise
+        finally:
+            if hasattr(parts, "close"):
+                parts.close()
+        # only complete streams are worth replaying
+        if recorder.complete:
+            self.cassette.append(recorder.entry)
+
+    async def _arecord_stream(self, op, entry, start, parts):
+        recorder = _StreamRecorder(op, entry, start)
+        try:
+            async for part in parts:
+                recorder.add(part)
+                yield part
+        except Exception as exc:
+            self._record_error(dict(entry, parts=recorder.parts), exc, start)
+            raise
+        finally:
+            if hasattr(parts, "aclose"):
+                await parts.aclose()
+        if recorder.complete:
+            self.cassette.append(recorder.entry)
+
+
+class _StreamRecorder:
+    def __init__(self, op, entry, start):
+        self.op = op
+        self.entry = entry
+        self.parts = entry["parts"] = []
+        self.last = start
+        self.complete = False
+
+    def add(self, part):
+        now = time.perf_counter()
+        delay_ms = round((now - self.last) * 1000, 1)
+        self.last = now
+        if part["done"]:
+            self.entry["final"] = _as_dict(part)
+            self.entry["final_delay_ms"] = delay_ms
+            self.complete = True
+        else:
+            text = part["message"]["content"] if self.op == "chat" else part["response"]
+            self.parts.append([delay_ms, text])
+
+
+def _arg(op, request):
+    return request["messages"] if op == "chat" else request["prompt"]
+
+
+def _rest(op, request):
+    return {name: value for name, value in request.items() if name != ("messages" if op == "chat" else "prompt")}
+
+
+def _duration(entry):
+    if "elapsed" in entry:
+        return entry["elapsed"]
+    return (sum(delay for delay, _ in entry.get("parts", ())) + entry.get("final_delay_ms", 0)) / 1000
+
+
+def _raise_recorded(entry):
+    error = entry.get("error")
+    if error is not None:
+        from ollama import ResponseError
+        raise ResponseError(error["message"], error["status"])
+
+
+def from_environment():
+    # ZODIAC_CASSETTE=path [ZODIAC_CASSETTE_MODE=record|replay|auto] [ZODIAC_CASSETTE_PACE=1.0]
+    path = os.environ.get("ZODIAC_CASSETTE")
+    if not path:
+        return None
+    return CassetteClient(path, os.environ.get("ZODIAC_CASSETTE_MODE", "auto"),
+                          pace=float(os.environ.get("ZODIAC_CASSETTE_PACE", "0") or 0))
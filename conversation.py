@@ -0,0 +1,106 @@
+# bounded conversation history for UserMemory
+# keeps the last turns in a ring buffer with a running token estimate, so the context
+# sent back to the model stays the same size no matter how long the session runs
+import re
+from collections import deque
+
+_CJK = re.compile("[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text):
+    # no tokenizer here: roughly one token per CJK character and one per 4 other characters
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _snippet(text, limit):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class ConversationHistory:
+    # max_turns / max_tokens bound what is kept verbatim; turns pushed out are collapsed
+    # into a short summary line (at most summary_chars characters in total)
+    def __init__(self, max_turns=20, max_tokens=2000, summary_chars=400):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summary_chars = summary_chars
+        self._turns = deque()
+        self._collapsed = deque()
+        self._collapsed_chars = 0
+        self.total_tokens = 0
+        self.dropped_turns = 0
+
+    # same call as list.append, so UserMemory.remember did not have to change
+    def append(self, turn):
+        user_input, agent_response = turn
+        tokens = estimate_tokens(user_input) + estimate_tokens(agent_response)
+        self._turns.append((user_input, agent_response, tokens))
+        self.total_tokens += tokens
+        while len(self._turns) > 1 and (
+                len(self._turns) > self.max_turns or self.total_tokens > self.max_tokens):
+            self._collapse(self._turns.popleft())
+
+    def _collapse(self, turn):
+        user_input, agent_response, tokens = turn
+        self.total_tokens -= tokens
+        self.dropped_turns += 1
+        line = f"{_snippet(user_input, 40)} -> {_snippet(agent_response, 60)}"
+        self._collapsed.append(line)
+        self._collapsed_chars += len(line)
+        # the summary is a ring buffer too, the oldest collapsed turns go first
+        while len(self._collapsed) > 1 and self._collapsed_chars > self.summary_chars:
+            self._collapsed_chars -= len(self._collapsed.popleft())
+
+    @property
+    def summary(self):
+        if not self._collapsed:
+            return ""
+        return "更早的对话摘要 earlier turns:\n" + "\n".join(self._collapsed)
+
+    def window(self, max_tokens):
+        # newest turns that fit into max_tokens, oldest first; walks back only as far as needed
+        picked = []
+        used = 0
+        for user_input, agent_response, tokens in reversed(self._turns):
+            if used + tokens > max_tokens:
+                break
+            picked.append((user_input, agent_response))
+            used += tokens
+        picked.reverse()
+        return picked, used
+
+    def to_messages(self, max_tokens):
+        # chat messages for the model: summary of collapsed turns (if it still fits), then the window
+        turns, used = self.window(max_tokens)
+        messages = []
+        summary = self.summary
+        if summary and used + estimate_tokens(summary) <= max_tokens:
+            messages.append({"role": "system", "content": summary})
+        for user_input, agent_response in turns:
+            messages.append({"role": "user", "content": user_input})
+            messages.append({"role": "assistant", "content": agent_response})
+        return messages
+
+    def clear(self):
+        self._turns.clear()
+        self._collapsed.clear()
+        self._collapsed_chars = 0
+        self.total_tokens = 0
+        self.dropped_turns = 0
+
+    def __len__(self):
+        return len(self._turns)
+
+    def __iter__(self):
+        for user_input, agent_response, _ in self._turns:
+            yield user_input, agent_response
+
+    def __getitem__(self, index):
+        user_input, agent_response, _ = self._turns[index]
+        return user_input, agent_response
+
+    def __bool__(self):
+        return bool(self._turns)
@@ -1,28 +1,153 @@
 #step1 implement a memory unit for AI
 # user memory class, def function
 
-from docx import Document
-import ollama
-from ollama import chat
-from ollama import ChatResponse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
 
-def read_word_file(file_path):
+from conversation import ConversationHistory, estimate_tokens
+from llm_cache import DEFAULT_CACHE_DIR
+from ollama_client import get_client
+from retrieval import BM25Index
+from think_filter import split_reasoning
+
+# documents used when UserMemory is not given paths; read on construction, never at import
+DEFAULT_RESUME_PATH = os.environ.get(
+    "ZODIAC_RESUME", "C:\\Users\\wengu\\Dropbox\\template\\resume_garywen_DS_DE.docx")
+DEFAULT_INTERVIEW_PATH = os.environ.get(
+    "ZODIAC_INTERVIEW", "C:\\Users\\wengu\\Dropbox\\interview\\Prep_interview.docx")
+
+def extract_word_text(file_path):
     """Extracts text from a .docx file"""
+    # python-docx is only needed on a cache miss
+    from docx import Document
     doc = Document(file_path)
     full_text = []
     for paragraph in doc.paragraphs:
         full_text.append(paragraph.text)
     return "\n".join(full_text)
 
+class DocumentCache:
+    """On-disk cache of extracted document text, keyed by path + mtime/size and by content hash"""
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, "documents.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        # hits: path, mtime and size unchanged, the file is not even read
+        # content_hits: file was touched or copied but the bytes are the same
+        # misses: the document had to be parsed
+        self.hits = 0
+        self.content_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL,"
+            " content_hash TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS texts (content_hash TEXT PRIMARY KEY, text TEXT NOT NULL)")
+
+    def get_text(self, file_path, extract=extract_word_text):
+        file_path = os.path.abspath(file_path)
+        st = os.stat(file_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT t.text FROM files f JOIN texts t ON t.content_hash = f.content_hash"
+                " WHERE f.path = ? AND f.mtime_ns = ? AND f.size = ?",
+                (file_path, st.st_mtime_ns, st.st_size)).fetchone()
+        if row is not None:
+            self.hits += 1
+            return row[0]
+
+        with open(file_path, "rb") as f:
+            content_hash = hashlib.sha256(f.read()).hexdigest()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM texts WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row is not None:
+            self.content_hits += 1
+            text = row[0]
+        else:
+            self.misses += 1
+            text = extract(file_path)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO texts VALUES (?, ?)", (content_hash, text))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (file_path, st.st_mtime_ns, st.st_size, content_hash))
+        return text
+
+    def stats(self):
+        lookups = self.hits + self.content_hits + self.misses
+        return {
+            "hits": self.hits,
+            "content_hits": self.content_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.content_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_document_cache = None
+
+def get_document_cache():
+    """The DocumentCache shared by read_word_file, opened on first use"""
+    global _document_cache
+    if _document_cache is None:
+        _document_cache = DocumentCache()
+    return _document_cache
+
+def document_cache_stats():
+    """Hit / miss counts of the shared document cache in this process"""
+    if _document_cache is None:
+        return {"hits": 0, "content_hits": 0, "misses": 0, "hit_rate": 0.0}
+    return _document_cache.stats()
+
+def read_word_file(file_path, use_cache=True):
+    """Extracts text from a .docx file, served from the document cache when unchanged"""
+    if not use_cache:
+        return extract_word_text(file_path)
+    return get_document_cache().get_text(file_path)
+
+def read_document(file_path):
+    """Text of a .docx (through the cache) or of a plain text file"""
+    if file_path.lower().endswith(".docx"):
+        return read_word_file(file_path)
+    with open(file_path, encoding="utf-8") as f:
+        return f.read()
+
 class UserMemory:
-    def __init__(self):
+    # the interview notes are optional, a missing file just means no notes
+    def __init__(self, resume_path=None, interview_path=None):
         #initialize memory
         # user details
-        self.resume = read_word_file("C:\\Users\\wengu\Dropbox\\template\\resume_garywen_DS_DE.docx")
-        self.senario = read_word_file("C:\\Users\\wengu\\Dropbox\\interview\\Prep_interview.docx")
+        self.resume = read_document(resume_path or DEFAULT_RESUME_PATH)
+        interview_path = interview_path or DEFAULT_INTERVIEW_PATH
+        self.senario = read_document(interview_path) if os.path.exists(interview_path) else ""
         self.profile = {}
-        # user chat history
-        self.history = []
+        # user chat history, bounded: old turns are collapsed into a short summary
+        self.history = ConversationHistory()
+        self._index = None
+
+    # BM25 index over the resume and interview notes, built on first use
+    def document_index(self):
+        if self._index is None:
+            self._index = BM25Index.from_documents({"resume": self.resume, "interview": self.senario})
+        return self._index
+
+    # background for a cover letter: the top_k paragraphs most relevant to the job,
+    # or both documents in full when top_k is None
+    def background(self, job_description, top_k=4):
+        if top_k is None:
+            return f"[resume]\n{self.resume}\n\n[interview]\n{self.senario}"
+        return self.document_index().top_k_text(job_description, top_k)
     
     def update_profile(self,cover_letter):
         # update user profile
@@ -41,8 +166,9 @@ class UserMemory:
 # step2 call function of LLM
 class DeepSeekR1Model:
     # user default LLm deepseek-r1:1.5b, the model could be changed.
-    def __init__(self,model_name="deepseek-r1:1.5b"):
+    def __init__(self,model_name="deepseek-r1:1.5b",client=None):
         self.model_name = model_name
+        self.client = client if client is not None else get_client()
     # combine zodiac and mbti, analyze the data based on LLM
     def analyze_personality(self,zodiac,mbti):
         prompt = (f"请结合星座“{zodiac}”和MBTI类型：{mbti}”"
@@ -53,13 +179,48 @@ class DeepSeekR1Model:
         # role: AI
         # role: user
 
-        response = ollama.chat(model=self.model_name,messages=[{"role":"user","content":prompt}])
+        response = self.client.chat(self.model_name,[{"role":"user","content":prompt}])
 
         return response['message']['content']
+
+    def build_cover_letter_prompt(self,background,job_description):
+        return ("Write a concise, specific cover letter for the job below. "
+                "Use only facts from the candidate background, and do not invent experience.\n\n"
+                f"Job description:\n{job_description}\n\n"
+                f"Candidate background:\n{background}")
+
+    # top_k paragraphs of resume / interview notes go into the prompt, top_k=None sends everything
+    def write_cover_letter(self,memory,job_description,top_k=4):
+        prompt = self.build_cover_letter_prompt(memory.background(job_description,top_k),job_description)
+        response = self.client.chat(self.model_name,[{"role":"user","content":prompt}])
+        # the letter only, without deepseek-r1's <think> section
+        return split_reasoning(response['message']['content'])[1]
+
+    async def awrite_cover_letter(self,memory,job_description,top_k=4):
+        prompt = self.build_cover_letter_prompt(memory.background(job_description,top_k),job_description)
+        response = await self.client.achat(self.model_name,[{"role":"user","content":prompt}])
+        return split_reasoning(response['message']['content'])[1]
+
+
+# prompt size (and, with run=True, latency) of a cover letter with full documents vs retrieval
+def compare_cover_letter_prompts(model,memory,job_description,top_k=4,run=True):
+    report = {}
+    for label, k in (("full", None), ("retrieved", top_k)):
+        prompt = model.build_cover_letter_prompt(memory.background(job_description,k),job_description)
+        entry = {"prompt_chars": len(prompt), "prompt_tokens_est": estimate_tokens(prompt)}
+        if run:
+            start = time.perf_counter()
+            response = model.client.chat(model.model_name,[{"role":"user","content":prompt}])
+            entry["seconds"] = round(time.perf_counter() - start, 3)
+            # exact count from the server when it reports one
+            entry["prompt_tokens"] = response.get('prompt_eval_count')
+        report[label] = entry
+    return report
     
 # model = DeepSeekR1Model()
 # print(model.analyze_personality("天蝎座","infp"))
 
-# Usage example
-text_content = read_word_file("C:\\Users\\wengu\Dropbox\\template\\resume_garywen_DS_DE.docx")
-print(text_content)
\ No newline at end of file
+if __name__ == "__main__":
+    # Usage example
+    text_content = read_word_file(DEFAULT_RESUME_PATH)
+    print(text_content)
@@ -0,0 +1,161 @@
+# one cover letter per job description in a folder
+#
+#   python zodiac.py coverletters jobs/ --resume resume.docx --out letters/
+#
+# job documents are parsed in a process pool (python-docx is slow and CPU bound), the model
+# calls run on an event loop with at most `concurrency` in flight, and every letter is
+# written to <out>/<job name>.txt the moment it is done. a manifest in the output folder
+# records the finished jobs with a hash of their text, so a run that was interrupted
+# continues where it stopped and a job description that was edited is written again.
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+
+from coverletter_ai import DeepSeekR1Model, UserMemory, read_document
+
+JOB_EXTENSIONS = (".docx", ".txt", ".md")
+MANIFEST_NAME = ".manifest.jsonl"
+
+# status: "written", "skipped" (already done in an earlier run) or "failed"
+JobResult = namedtuple("JobResult", ["job", "output", "status", "error", "elapsed"])
+
+
+def find_jobs(job_dir):
+    names = sorted(name for name in os.listdir(job_dir)
+                   if name.lower().endswith(JOB_EXTENSIONS) and not name.startswith(("~$", ".")))
+    return [os.path.join(job_dir, name) for name in names]
+
+
+def output_path(out_dir, job_path):
+    return os.path.join(out_dir, os.path.splitext(os.path.basename(job_path))[0] + ".txt")
+
+
+def settings_hash(model_name, top_k, memory):
+    # another model, prompt size, resume or interview notes make every letter another letter
+    raw = "\x1f".join([model_name, str(top_k), memory.resume, memory.senario])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def text_hash(text, settings):
+    raw = "\x1f".join([settings, text])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def file_fingerprint(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+class Manifest:
+    # append-only JSON lines: {"job": name, "hash": ..., "file": [mtime_ns, size], "settings": ...}
+    # a line is only written after its letter is safely on disk; the last line for a job wins
+    def __init__(self, out_dir):
+        self.path = os.path.join(out_dir, MANIFEST_NAME)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue        # a line cut short by a crash
+                    self.entries[entry["job"]] = entry
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def unchanged(self, job_path, settings):
+        # the job file was not touched since its letter was written with the same settings:
+        # no need to even parse it
+        entry = self.entries.get(os.path.basename(job_path))
+        return (entry is not None and entry.get("file") == file_fingerprint(job_path)
+                and entry.get("settings") == settings)
+
+    def done(self, job_path, digest):
+        entry = self.entries.get(os.path.basename(job_path))
+        return entry is not None and entry["hash"] == digest
+
+    def record(self, job_path, digest, settings):
+        entry = {"job": os.path.basename(job_path), "hash": digest, "file": file_fingerprint(job_path),
+                 "settings": settings}
+        self.entries[entry["job"]] = entry
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def write_atomic(path, text):
+    # a letter is either complete on disk or not there at all, even if we are killed mid-write
+    tmp = path + ".part"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+async def generate_cover_letters(job_dir, out_dir, memory, model, top_k=4, concurrency=2,
+                                 workers=None, on_result=None):
+    # memory: coverletter_ai.UserMemory with the resume; model: coverletter_ai.DeepSeekR1Model
+    # concurrency: model calls in flight (match OLLAMA_NUM_PARALLEL); workers: parser processes
+    # on_result(JobResult) is called as each job finishes; returns the list of JobResults
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = find_jobs(job_dir)
+    manifest = Manifest(out_dir)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    results = []
+    # the index over the resume is built once here, not once per job
+    memory.document_index()
+    settings = settings_hash(model.model_name, top_k, memory)
+
+    def finish(result):
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    async def run_job(pool, job_path):
+        out_path = output_path(out_dir, job_path)
+        start = time.perf_counter()
+        if manifest.unchanged(job_path, settings) and os.path.exists(out_path):
+            finish(JobResult(job_path, out_path, "skipped", None, 0.0))
+            return
+        try:
+            job_description = await loop.run_in_executor(pool, read_document, job_path)
+            digest = text_hash(job_description, settings)
+            if manifest.done(job_path, digest) and os.path.exists(out_path):
+                # touched but not edited
+                manifest.record(job_path, digest, settings)
+                finish(JobResult(job_path, out_path, "skipped", None, time.perf_counter() - start))
+                return
+            async with semaphore:
+                letter = await model.awrite_cover_letter(memory, job_description, top_k)
+            write_atomic(out_path, letter)
+            manifest.record(job_path, digest, settings)
+        except Exception as exc:
+            finish(JobResult(job_path, out_path, "failed", exc, time.perf_counter() - start))
+            return
+        finish(JobResult(job_path, out_path, "written", None, time.perf_counter() - start))
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            await asyncio.gather(*(run_job(pool, job_path) for job_path in jobs))
+    finally:
+        manifest.close()
+    return results
+
+
+def run_pipeline(job_dir, out_dir, resume_path=None, interview_path=None, model_name="deepseek-r1:1.5b",
+                 top_k=4, concurrency=2, workers=None, on_result=None, client=None):
+    import asyncio
+
+    memory = UserMemory(resume_path, interview_path)
+    model = DeepSeekR1Model(model_name, client=client)
+    return asyncio.run(generate_cover_letters(job_dir, out_dir, memory, model, top_k, concurrency,
+                                              workers, on_result))
@@ -0,0 +1,218 @@
+# local stand-in for the Ollama HTTP API, for benchmarks and demos without a real model
+# speaks enough of /api/chat and /api/generate (streaming NDJSON and plain JSON) for the
+# ollama python client, with a configurable token rate, first-token delay, parallel slots
+# and injected failures
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_TEXT = ("<think>用户想了解天蝎座和INFP的组合，我先想想两者的共同点。</think>"
+                "你好，我是Astra。天蝎座的深沉与INFP的理想主义交织在一起，"
+                "让你拥有敏锐的洞察力和温柔而坚定的内心。")
+
+
+class FakeOllamaConfig:
+    # token_rate: tokens per second after the first one, first_token_delay: seconds before it,
+    # parallel: generations served at once (like OLLAMA_NUM_PARALLEL), failure_rate: share of
+    # requests answered with HTTP 500, tokens: how many tokens each reply has
+    def __init__(self, token_rate=200.0, first_token_delay=0.05, parallel=4, failure_rate=0.0,
+                 tokens=64, text=DEFAULT_TEXT, seed=0):
+        self.token_rate = token_rate
+        self.first_token_delay = first_token_delay
+        self.parallel = parallel
+        self.failure_rate = failure_rate
+        self.tokens = tokens
+        self.text = text
+        self.seed = seed
+
+
+def _split_tokens(text, count):
+    # keep <think> tags whole, everything else one character per token, repeated to length
+    pieces = []
+    i = 0
+    while i < len(text):
+        for tag in ("<think>", "</think>"):
+            if text.startswith(tag, i):
+                pieces.append(tag)
+                i += len(tag)
+                break
+        else:
+            pieces.append(text[i])
+            i += 1
+    while len(pieces) < count:
+        pieces.extend(pieces[:count - len(pieces)])
+    return pieces[:count]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-fake"})
+        elif self.path == "/api/tags":
+            self._send_json(200, {"models": []})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path not in ("/api/chat", "/api/generate"):
+            self._send_json(404, {"error": "not found"})
+            return
+        server = self.server
+        server.count_request()
+        if server.should_fail():
+            self._send_json(500, {"error": "injected failure"})
+            return
+
+        prompt = body.get("prompt")
+        if self.path == "/api/generate" and not prompt:
+            # empty prompt: load / unload request, answered right away
+            self._send_json(200, self._part(body, "", done=True, prompt_tokens=0, tokens=0))
+            return
+
+        config = server.config
+        tokens = _split_tokens(config.text, config.tokens)
+        prompt_tokens = len(json.dumps(body.get("messages") or prompt or "", ensure_ascii=False)) // 2
+        with server.slots:
+            if not body.get("stream", True):
+                time.sleep(config.first_token_delay + len(tokens) / config.token_rate)
+                self._send_json(200, self._part(body, "".join(tokens), done=True,
+                                                prompt_tokens=prompt_tokens, tokens=len(tokens)))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                time.sleep(config.first_token_delay)
+                for token in tokens:
+                    self._write_chunk(self._part(body, token))
+                    time.sleep(1.0 / config.token_rate)
+                self._write_chunk(self._part(body, "", done=True,
+                                             prompt_tokens=prompt_tokens, tokens=len(tokens)))
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # client went away (cancelled), stop generating like the real server does
+                server.count_cancel()
+
+    def _part(self, body, text, done=False, prompt_tokens=0, tokens=0):
+        part = {
+            "model": body.get("model", ""),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": done,
+        }
+        if self.path == "/api/chat":
+            part["message"] = {"role": "assistant", "content": text}
+        else:
+            part["response"] = text
+        if done:
+            part.update(done_reason="stop", total_duration=0, load_duration=0,
+                        prompt_eval_count=prompt_tokens, eval_count=tokens)
+            if self.path == "/api/generate":
+                # stand-in for the real KV context: previous context plus one id per new token
+                context = list(body.get("context") or [])
+                part["context"] = context + list(range(len(context), len(context) + prompt_tokens + tokens))
+        return part
+
+    def _write_chunk(self, part):
+        line = (json.dumps(part, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or FakeOllamaConfig()
+        self.slots = threading.BoundedSemaphore(max(1, self.config.parallel))
+        self.requests = 0
+        self.cancelled = 0
+        self._random = random.Random(self.config.seed)
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        super().__init__((host, port), _Handler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self):
+        with self._stats_lock:
+            self.requests += 1
+
+    def count_cancel(self):
+        with self._stats_lock:
+            self.cancelled += 1
+
+    def should_fail(self):
+        with self._stats_lock:
+            return self._random.random() < self.config.failure_rate
+
+    def start(self):
+        # serve in a background thread, returns the base URL to use as the Ollama host
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fake Ollama server")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=64)
+    args = parser.parse_args()
+    config = FakeOllamaConfig(token_rate=args.token_rate, first_token_delay=args.first_token_delay,
+                              parallel=args.parallel, failure_rate=args.failure_rate, tokens=args.tokens)
+    server = FakeOllamaServer(config, port=args.port)
+    print(f"fake ollama listening on {server.url}  (OLLAMA_HOST={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
 #step1 implement a memory unit for AI
 # user memory class, def function
+from conversation import ConversationHistory
+
 class UserMemory:
     def __init__(self):
         #initialize memory
         # user details
         self.profile = {}
-        # user chat history
-        self.history = []
+        # user chat history, bounded: old turns are collapsed into a short summary
+        self.history = ConversationHistory()
+        # (model name, context ids) returned by the model after the last chat turn, see ChatSession.
+        # only kept in memory: after a restart the chat continues from the compacted history
+        self.model_context = None
     
     def update_profile(self,zodiac,mbti,gender):
         # update user profile
@@ -19,28 +24,488 @@ class UserMemory:
     # improve memory
     def remember(self, user_input, agent_response):
         self.history.append((user_input,agent_response))
-import ollama
-from ollama import chat
-from ollama import ChatResponse
+import json
+import time
+from collections import namedtuple
+
+from canonical import canonical_key
+from llm_cache import ResponseCache, prompt_hash
+from ollama_client import get_client
+from singleflight import AsyncSingleFlight, SingleFlight
+from think_filter import ReasoningLimitExceeded, ThinkFilter, split_reasoning
+
+# one piece of a streamed reading
+# ttft: seconds until the first visible token arrived, elapsed: seconds since the request was sent
+# kind: "reasoning" for the <think> part of deepseek-r1, "answer" for the reading itself
+StreamChunk = namedtuple("StreamChunk", ["text", "ttft", "elapsed", "done", "kind"], defaults=("answer",))
+
+# one finished item of analyze_many; error is the exception raised for that pair, text is None then
+BatchResult = namedtuple("BatchResult", ["index", "zodiac", "mbti", "text", "error", "elapsed"])
+
+# the prompt for a reading; any edit here changes PROMPT_HASH and invalidates cached readings
+PROMPT_TEMPLATE = ("请结合星座“{zodiac}”和MBTI类型：{mbti}”"
+                   "分析该类型人的核心性格特征、情感倾向、适合的职业与成长方向。"
+                   "要求以一个性格、星座分析专家口吻，风格专业、神秘、温柔，同时具有心理学背景，以Astra这个名字自称")
+PROMPT_HASH = prompt_hash(PROMPT_TEMPLATE)
+
+# persona for free-form questions (ask / stream_ask)
+ASK_SYSTEM_PROMPT = ("你是Astra，一位性格、星座分析专家，同时具有心理学背景，"
+                     "说话风格专业、神秘、温柔。")
+
+# appended when a reading is asked again after the reasoning ran over its budget
+DIRECT_ANSWER_HINT = "\n请不要展开冗长的思考过程，直接给出分析结果。"
+
+
+# "infp ", "INFP-T", "Scorpio" and "天蝎" should be the same reading: one of the 192 canonical
+# (sign, type) pairs, see canonical.py; raises canonical.InvalidInput for anything else
+def normalize_inputs(zodiac,mbti):
+    return canonical_key(zodiac,mbti)
+
+
+# bookkeeping shared by stream_personality and astream_personality:
+# timing, <think> separation and the raw text that goes into the cache
+class _ReadingStream:
+    def __init__(self,hide_reasoning,max_reasoning_tokens):
+        self.hide_reasoning = hide_reasoning
+        self.max_reasoning_tokens = max_reasoning_tokens
+        self.start = time.perf_counter()
+        self.ttft = None
+        self.restart()
+
+    def restart(self):
+        # a new generation for the same reading, timing keeps counting from the first request
+        self.filter = ThinkFilter(self.max_reasoning_tokens)
+        self.parts = []
+
+    @property
+    def raw_text(self):
+        return "".join(self.parts)
+
+    def feed_cached(self,text):
+        # a cached reading is complete already, the reasoning cap only applies to live generations
+        self.filter.max_reasoning_tokens = None
+        return self.feed(text,True)
+
+    def feed(self,text,done):
+        self.parts.append(text)
+        pieces = self.filter.feed(text)
+        if done:
+            pieces += self.filter.flush()
+        elapsed = time.perf_counter() - self.start
+        chunks = []
+        for kind, piece in pieces:
+            if self.hide_reasoning and kind == "reasoning":
+                continue
+            if self.ttft is None:
+                self.ttft = elapsed
+            chunks.append(StreamChunk(piece, self.ttft, elapsed, False, kind))
+        if done:
+            chunks.append(StreamChunk("", self.ttft, elapsed, True, "answer"))
+        return chunks
+
 
 # step2 call function of LLM
 class DeepSeekR1Model:
     # user default LLm deepseek-r1:1.5b, the model could be changed.
-    def __init__(self,model_name="deepseek-r1:1.5b"):
+    # cache: an optional llm_cache.ResponseCache, repeat readings are then served from disk
+    # client: an ollama_client.OllamaClient, the shared one by default
+    # warm_up: preload the model now so the first reading does not pay the load time
+    # coalesce: identical requests arriving while one is generating share that generation
+    def __init__(self,model_name="deepseek-r1:1.5b",cache=None,client=None,warm_up=False,coalesce=True):
         self.model_name = model_name
+        self.cache = cache
+        self.client = client if client is not None else get_client()
+        self.coalesce = coalesce
+        self._flights = SingleFlight()
+        self._async_flights = AsyncSingleFlight()
+        if warm_up:
+            self.client.warm_up(self.model_name)
+        if self.cache is not None:
+            # readings generated from an older prompt text are no longer valid
+            self.cache.purge_stale(PROMPT_HASH)
+
+    def build_prompt(self,zodiac,mbti):
+        return PROMPT_TEMPLATE.format(zodiac=zodiac,mbti=mbti)
+
+    def cached_reading(self,zodiac,mbti):
+        if self.cache is None:
+            return None
+        return self.cache.get(self.model_name,(zodiac,mbti),PROMPT_HASH)
+
+    def store_reading(self,zodiac,mbti,text):
+        if self.cache is not None and text:
+            self.cache.put(self.model_name,(zodiac,mbti),PROMPT_HASH,text)
+
     # combine zodiac and mbti, analyze the data based on LLM
-    def analyze_personality(self,zodiac,mbti):
-        prompt = (f"请结合星座“{zodiac}”和MBTI类型：{mbti}”"
-                  f"分析该类型人的核心性格特征、情感倾向、适合的职业与成长方向。"
-                  f"要求以一个性格、星座分析专家口吻，风格专业、神秘、温柔，同时具有心理学背景，以Astra这个名字自称")
+    # hide_reasoning: return only the reading, without the <think> section
+    # max_reasoning_tokens: stream internally and stop runaway reasoning (see stream_personality)
+    def analyze_personality(self,zodiac,mbti,hide_reasoning=False,max_reasoning_tokens=None):
+        # streaming internally lets concurrent identical calls share one generation
+        if self.coalesce or max_reasoning_tokens is not None:
+            # the raw text, <think> tags included, the same as the non-streamed call below
+            reading = _ReadingStream(False,max_reasoning_tokens)
+            for _ in self._stream_reading(zodiac,mbti,reading,"reprompt"):
+                pass
+            text = reading.raw_text
+            return split_reasoning(text)[1] if hide_reasoning else text
+        zodiac, mbti = normalize_inputs(zodiac,mbti)
+        text = self.cached_reading(zodiac,mbti)
+        if text is None:
+            prompt = self.build_prompt(zodiac,mbti)
 
+            # role: AI
+            # role: user
 
-        # role: AI
-        # role: user
+            response = self.client.chat(self.model_name,[{"role":"user","content":prompt}])
 
-        response = ollama.chat(model=self.model_name,messages=[{"role":"user","content":prompt}])
+            text = response['message']['content']
+            self.store_reading(zodiac,mbti,text)
+        if hide_reasoning:
+            return split_reasoning(text)[1]
+        return text
 
-        return response['message']['content']
-    
-model = DeepSeekR1Model()
-print(model.analyze_personality("天蝎座","infp"))
+    # same reading as analyze_personality, but yields StreamChunk as the tokens arrive.
+    # hide_reasoning drops the <think> chunks (ttft is then the time to the first answer token).
+    # once the reasoning passes max_reasoning_tokens the generation is stopped, then
+    # on_reasoning_limit="abort" raises ReasoningLimitExceeded and "reprompt" asks once more
+    # for a direct answer (a second overrun raises).
+    def stream_personality(self,zodiac,mbti,hide_reasoning=False,max_reasoning_tokens=None,
+                           on_reasoning_limit="abort"):
+        reading = _ReadingStream(hide_reasoning,max_reasoning_tokens)
+        yield from self._stream_reading(zodiac,mbti,reading,on_reasoning_limit)
+
+    def _stream_reading(self,zodiac,mbti,reading,on_reasoning_limit):
+        zodiac, mbti = normalize_inputs(zodiac,mbti)
+        cached = self.cached_reading(zodiac,mbti)
+        if cached is not None:
+            yield from reading.feed_cached(cached)
+            return
+        prompt = self.build_prompt(zodiac,mbti)
+        try:
+            yield from self._stream_messages([{"role":"user","content":prompt}],reading)
+        except ReasoningLimitExceeded:
+            if on_reasoning_limit != "reprompt":
+                raise
+            reading.restart()
+            yield from self._stream_messages([{"role":"user","content":prompt + DIRECT_ANSWER_HINT}],reading)
+        self.store_reading(zodiac,mbti,reading.raw_text)
+
+    def _raw_parts(self,messages):
+        stream = self.client.chat(self.model_name,messages,stream=True)
+        try:
+            for part in stream:
+                yield part['message']['content'], part['done']
+        finally:
+            # closing the response stops the generation on the server when we bail out early
+            stream.close()
+
+    def _flight_key(self,messages):
+        return self.model_name + "\x1f" + json.dumps(messages,ensure_ascii=False,sort_keys=True)
+
+    def _stream_messages(self,messages,reading):
+        if self.coalesce:
+            parts = self._flights.stream(self._flight_key(messages),lambda: self._raw_parts(messages))
+        else:
+            parts = self._raw_parts(messages)
+        try:
+            for text, done in parts:
+                yield from reading.feed(text,done)
+        finally:
+            # with coalescing this only detaches us, the other subscribers keep streaming
+            parts.close()
+
+    # async iterator version of stream_personality, for callers running an event loop
+    async def astream_personality(self,zodiac,mbti,hide_reasoning=False,max_reasoning_tokens=None,
+                                  on_reasoning_limit="abort"):
+        reading = _ReadingStream(hide_reasoning,max_reasoning_tokens)
+        async for chunk in self._astream_reading(zodiac,mbti,reading,on_reasoning_limit):
+            yield chunk
+
+    async def _astream_reading(self,zodiac,mbti,reading,on_reasoning_limit):
+        zodiac, mbti = normalize_inputs(zodiac,mbti)
+        cached = self.cached_reading(zodiac,mbti)
+        if cached is not None:
+            for chunk in reading.feed_cached(cached):
+                yield chunk
+            return
+        prompt = self.build_prompt(zodiac,mbti)
+        try:
+            async for chunk in self._astream_messages([{"role":"user","content":prompt}],reading):
+                yield chunk
+        except ReasoningLimitExceeded:
+            if on_reasoning_limit != "reprompt":
+                raise
+            reading.restart()
+            async for chunk in self._astream_messages([{"role":"user","content":prompt + DIRECT_ANSWER_HINT}],reading):
+                yield chunk
+        self.store_reading(zodiac,mbti,reading.raw_text)
+
+    async def _araw_parts(self,messages):
+        stream = await self.client.achat(self.model_name,messages,stream=True)
+        try:
+            async for part in stream:
+                yield part['message']['content'], part['done']
+        finally:
+            await stream.aclose()
+
+    async def _astream_messages(self,messages,reading):
+        if self.coalesce:
+            parts = self._async_flights.stream(self._flight_key(messages),lambda: self._araw_parts(messages))
+        else:
+            parts = self._araw_parts(messages)
+        try:
+            async for text, done in parts:
+                for chunk in reading.feed(text,done):
+                    yield chunk
+        finally:
+            await parts.aclose()
+
+    # free-form question to Astra; with a UserMemory its profile and the recent turns
+    # (at most context_tokens) are sent along. the caller decides whether to remember the turn.
+    def build_ask_messages(self,question,memory=None,context_tokens=1500):
+        system = ASK_SYSTEM_PROMPT
+        messages = []
+        if memory is not None:
+            if memory.profile:
+                system += "用户资料：" + "，".join(f"{key}: {value}" for key, value in memory.profile.items())
+            messages = memory.history.to_messages(context_tokens)
+        return [{"role":"system","content":system}] + messages + [{"role":"user","content":question}]
+
+    def stream_ask(self,question,memory=None,hide_reasoning=True,context_tokens=1500):
+        reading = _ReadingStream(hide_reasoning,None)
+        yield from self._stream_messages(self.build_ask_messages(question,memory,context_tokens),reading)
+
+    def ask(self,question,memory=None,hide_reasoning=True,context_tokens=1500):
+        return "".join(chunk.text for chunk in self.stream_ask(question,memory,hide_reasoning,context_tokens))
+
+    async def astream_ask(self,question,memory=None,hide_reasoning=True,context_tokens=1500):
+        reading = _ReadingStream(hide_reasoning,None)
+        async for chunk in self._astream_messages(self.build_ask_messages(question,memory,context_tokens),reading):
+            yield chunk
+
+    # multi-turn chat on top of a UserMemory that reuses the model context between turns
+    def chat_session(self,memory=None,**kwargs):
+        return ChatSession(self,memory if memory is not None else UserMemory(),**kwargs)
+
+    # async, non-streaming analyze_personality
+    async def aanalyze_personality(self,zodiac,mbti,hide_reasoning=False):
+        if self.coalesce:
+            reading = _ReadingStream(False,None)
+            chunks = self._astream_reading(zodiac,mbti,reading,"abort")
+            try:
+                async for _ in chunks:
+                    pass
+            finally:
+                # close right away when cancelled (deadline), not whenever the generator is collected
+                await chunks.aclose()
+            text = reading.raw_text
+            return split_reasoning(text)[1] if hide_reasoning else text
+        zodiac, mbti = normalize_inputs(zodiac,mbti)
+        text = self.cached_reading(zodiac,mbti)
+        if text is None:
+            prompt = self.build_prompt(zodiac,mbti)
+            response = await self.client.achat(self.model_name,[{"role":"user","content":prompt}])
+            text = response['message']['content']
+            self.store_reading(zodiac,mbti,text)
+        if hide_reasoning:
+            return split_reasoning(text)[1]
+        return text
+
+    # readings for many (zodiac, mbti) pairs, at most max_concurrency requests in flight.
+    # async generator of BatchResult: in completion order by default, in input order with
+    # ordered=True (each result is released as soon as everything before it is done).
+    # a failing pair yields a BatchResult with error set and does not stop the batch.
+    # the server only runs OLLAMA_NUM_PARALLEL generations at once, so max_concurrency
+    # above that just queues on the server side.
+    async def analyze_many(self,pairs,max_concurrency=4,ordered=False):
+        # asyncio is imported where it is used, it is a noticeable part of CLI start-up
+        import asyncio
+
+        pairs = list(pairs)
+        results = asyncio.Queue()
+        todo = iter(enumerate(pairs))
+
+        async def worker():
+            # workers share one iterator, each takes the next pair when it becomes free
+            for index, (zodiac, mbti) in todo:
+                start = time.perf_counter()
+                try:
+                    text = await self.aanalyze_personality(zodiac,mbti)
+                    error = None
+                except Exception as exc:
+                    text, error = None, exc
+                await results.put(BatchResult(index, zodiac, mbti, text, error, time.perf_counter() - start))
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(max_concurrency, len(pairs))))]
+        waiting = {}
+        next_index = 0
+        try:
+            for _ in range(len(pairs)):
+                result = await results.get()
+                if not ordered:
+                    yield result
+                    continue
+                waiting[result.index] = result
+                while next_index in waiting:
+                    yield waiting.pop(next_index)
+                    next_index += 1
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    # blocking helper around analyze_many, returns the BatchResults in input order
+    def analyze_many_sync(self,pairs,max_concurrency=4):
+        import asyncio
+
+        async def collect():
+            return [result async for result in self.analyze_many(pairs,max_concurrency,ordered=True)]
+        return asyncio.run(collect())
+
+# multi-turn chat that does not resend the transcript every turn.
+# /api/generate returns the context (token ids) of the conversation so far; passing it back
+# with only the new message lets the server reuse its cached prefix, so the work per turn
+# depends on the new message, not on the length of the conversation. when that state is
+# lost (new process, session evicted, other model, context close to num_ctx, server rejects
+# it) the turn is sent once as a compacted transcript of memory.history instead.
+class ChatSession:
+    def __init__(self,model,memory,num_ctx=4096,context_tokens=1500,hide_reasoning=True):
+        self.model = model
+        self.memory = memory
+        self.num_ctx = num_ctx
+        self.context_tokens = context_tokens
+        self.hide_reasoning = hide_reasoning
+        self.context_turns = 0
+        self.transcript_turns = 0
+
+    def _usable_context(self):
+        state = self.memory.model_context
+        if not state or state[0] != self.model.model_name:
+            return None
+        # leave room for the new turn, a context at the window size would be truncated
+        if len(state[1]) > self.num_ctx * 0.75:
+            return None
+        return state[1]
+
+    def _system(self):
+        system = ASK_SYSTEM_PROMPT
+        if self.memory.profile:
+            system += "用户资料：" + "，".join(f"{key}: {value}" for key, value in self.memory.profile.items())
+        return system
+
+    def _transcript_prompt(self,message):
+        lines = []
+        for entry in self.memory.history.to_messages(self.context_tokens):
+            speaker = {"user": "用户", "assistant": "Astra"}.get(entry["role"], "")
+            lines.append(f"{speaker}：{entry['content']}" if speaker else entry["content"])
+        lines.append(f"用户：{message}")
+        return "\n".join(lines)
+
+    def _request(self,message):
+        context = self._usable_context()
+        options = {"num_ctx": self.num_ctx}
+        if context is not None:
+            return {"prompt": message, "context": context, "options": options}
+        return {"prompt": self._transcript_prompt(message), "system": self._system(), "options": options}
+
+    def _finish(self,message,reading,part,used_context,on_answer):
+        context = part.get('context')
+        self.memory.model_context = (self.model.model_name, list(context)) if context else None
+        if used_context:
+            self.context_turns += 1
+        else:
+            self.transcript_turns += 1
+        answer = split_reasoning(reading.raw_text)[1]
+        if on_answer is not None:
+            on_answer(answer)
+        else:
+            self.memory.remember(message,answer)
+
+    # yields StreamChunk; the turn is remembered in memory when it completes, or handed to
+    # on_answer(answer) instead (e.g. SessionStore.remember, which also persists it)
+    def stream(self,message,on_answer=None):
+        from ollama import ResponseError
+
+        reading = _ReadingStream(self.hide_reasoning,None)
+        request = self._request(message)
+        try:
+            yield from self._generate(message,request,reading,on_answer)
+        except ResponseError:
+            if "context" not in request or reading.parts:
+                raise
+            # the server would not take the saved context, start over from the history
+            self.memory.model_context = None
+            yield from self._generate(message,self._request(message),reading,on_answer)
+
+    def _generate(self,message,request,reading,on_answer):
+        stream = self.model.client.generate(self.model.model_name,stream=True,**request)
+        try:
+            for part in stream:
+                chunks = reading.feed(part['response'],part['done'])
+                if part['done']:
+                    self._finish(message,reading,part,"context" in request,on_answer)
+                yield from chunks
+        finally:
+            stream.close()
+
+    def send(self,message):
+        return "".join(chunk.text for chunk in self.stream(message))
+
+    async def astream(self,message,on_answer=None):
+        from ollama import ResponseError
+
+        reading = _ReadingStream(self.hide_reasoning,None)
+        request = self._request(message)
+        try:
+            async for chunk in self._agenerate(message,request,reading,on_answer):
+                yield chunk
+        except ResponseError:
+            if "context" not in request or reading.parts:
+                raise
+            self.memory.model_context = None
+            async for chunk in self._agenerate(message,self._request(message),reading,on_answer):
+                yield chunk
+
+    async def _agenerate(self,message,request,reading,on_answer):
+        stream = await self.model.client.agenerate(self.model.model_name,stream=True,**request)
+        try:
+            async for part in stream:
+                chunks = reading.feed(part['response'],part['done'])
+                if part['done']:
+                    self._finish(message,reading,part,"context" in request,on_answer)
+                for chunk in chunks:
+                    yield chunk
+        finally:
+            await stream.aclose()
+
+
+# (chunk, text to print) for every chunk: the reasoning is put back between <think> tags,
+# so printed it reads like the non-streamed reading instead of running into the answer
+def display_text(chunks):
+    in_reasoning = False
+    for chunk in chunks:
+        text = chunk.text
+        if chunk.kind == "reasoning" and not in_reasoning:
+            text = "<think>" + text
+            in_reasoning = True
+        elif chunk.kind != "reasoning" and in_reasoning:
+            text = "</think>" + text
+            in_reasoning = False
+        yield chunk, text
+
+
+# print the reading while it is generated instead of waiting for the whole text
+def print_stream(chunks):
+    last = None
+    for chunk, text in display_text(chunks):
+        print(text, end="", flush=True)
+        last = chunk
+    print()
+    if last is not None and last.ttft is not None:
+        print(f"[首字延迟 time to first token: {last.ttft:.2f}s, 总耗时 total: {last.elapsed:.2f}s]")
+    return last
+
+
+if __name__ == "__main__":
+    model = DeepSeekR1Model(cache=ResponseCache())
+    print_stream(model.stream_personality("天蝎座","infp"))
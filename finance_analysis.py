@@ -0,0 +1,233 @@
+# local numeric pre-analysis for financial prompts
+# the model is bad (and slow) at arithmetic over long tables, so growth rates, CAGR, shares
+# and outliers are computed here with numpy and the prompt only carries a short summary.
+#
+# CSV input, either wide:              or long:
+#   项目,2022,2023,2024                  项目,年份,金额
+#   资本支出,30,35,41                    资本支出,2022,30
+#   营业收入,520,610,580                 资本支出,2023,35
+# numbers may contain thousands separators, (1,234) is -1234; empty cells are missing values,
+# and so are cells that are not numbers at all (they are listed in Table.unparsed).
+import csv
+from collections import namedtuple
+
+import numpy as np
+
+# items: line item names, years: column labels, values: float array (items x years), nan = missing
+# unparsed: (item, year, cell) of the cells that were not numbers and became nan
+Table = namedtuple("Table", ["items", "years", "values", "unparsed"], defaults=((),))
+
+LONG_YEAR_HEADERS = ("year", "年份", "年度", "period")
+
+
+def _number(cell):
+    cell = cell.strip().replace(",", "").replace("，", "")
+    if not cell or cell in ("-", "—", "N/A", "n/a"):
+        return np.nan
+    sign = 1.0
+    if cell.startswith(("(", "（")) and cell.endswith((")", "）")):
+        # accounting negative
+        sign, cell = -1.0, cell[1:-1].strip()
+    if cell.endswith("%"):
+        return sign * float(cell[:-1]) / 100
+    return sign * float(cell)
+
+
+def _cell(cell, item, year, unparsed):
+    # one value of the table; a cell that is not a number is missing and remembered
+    try:
+        return _number(cell)
+    except ValueError:
+        unparsed.append((item, year, cell.strip()))
+        return np.nan
+
+
+def load_csv(path, encoding="utf-8-sig"):
+    with open(path, newline="", encoding=encoding) as f:
+        rows = [row for row in csv.reader(f) if row and any(cell.strip() for cell in row)]
+    if not rows:
+        raise ValueError(f"{path} is empty")
+    header, body = rows[0], rows[1:]
+    if len(header) == 3 and header[1].strip().lower() in LONG_YEAR_HEADERS:
+        return _from_long(body)
+    items = [row[0].strip() for row in body]
+    years = [cell.strip() for cell in header[1:]]
+    values = np.full((len(body), len(years)), np.nan)
+    unparsed = []
+    for i, row in enumerate(body):
+        for j, cell in enumerate(row[1:len(years) + 1]):
+            values[i, j] = _cell(cell, items[i], years[j], unparsed)
+    return Table(items, years, values, unparsed)
+
+
+def _from_long(body):
+    # rows without item, year and amount cannot be placed, they are left out
+    body = [row for row in body if len(row) >= 3]
+    items, years = {}, {}
+    for row in body:
+        items.setdefault(row[0].strip(), len(items))
+        years.setdefault(row[1].strip(), None)
+    year_list = sorted(years)
+    year_index = {year: j for j, year in enumerate(year_list)}
+    values = np.full((len(items), len(year_list)), np.nan)
+    unparsed = []
+    for row in body:
+        item, year = row[0].strip(), row[1].strip()
+        values[items[item], year_index[year]] = _cell(row[2], item, year, unparsed)
+    return Table(list(items), year_list, values, unparsed)
+
+
+def growth_rates(values):
+    # year-over-year growth, items x (years - 1); nan where the earlier value is 0 or missing
+    prev, cur = values[:, :-1], values[:, 1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (cur - prev) / np.abs(prev)
+    growth[~np.isfinite(growth)] = np.nan
+    return growth
+
+
+def _parse_years(labels):
+    # the column labels as numbers ("2022", "2023年"), None unless they all parse
+    try:
+        return np.array([float(label.strip().rstrip("年")) for label in labels])
+    except ValueError:
+        return None
+
+
+def _year_numbers(labels):
+    # the years of the columns, so gaps between reported years count; otherwise one period
+    # per column
+    years = _parse_years(labels)
+    return np.arange(len(labels), dtype=float) if years is None else years
+
+
+def cagr(values, years=None):
+    # compound annual growth between the first and the last reported value of each item;
+    # nan unless both are positive and at least one year apart.
+    # years: the column labels (see _year_numbers), default one period per column
+    finite = np.isfinite(values)
+    years = np.arange(values.shape[1], dtype=float) if years is None else _year_numbers(years)
+    first_idx = np.where(finite.any(axis=1), finite.argmax(axis=1), 0)
+    last_idx = np.where(finite.any(axis=1), values.shape[1] - 1 - finite[:, ::-1].argmax(axis=1), 0)
+    rows = np.arange(values.shape[0])
+    first, last = values[rows, first_idx], values[rows, last_idx]
+    periods = years[last_idx] - years[first_idx]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = np.power(last / first, 1.0 / periods) - 1.0
+    result[(periods <= 0) | ~(first > 0) | ~(last > 0)] = np.nan
+    return result
+
+
+def robust_z(x):
+    # modified z-score (median / MAD), not dragged around by the outliers it is looking for
+    finite = x[np.isfinite(x)]
+    if finite.size < 3:
+        return np.full_like(x, np.nan)
+    median = np.median(finite)
+    mad = np.median(np.abs(finite - median))
+    if mad == 0:
+        mad = np.mean(np.abs(finite - median)) or 1.0
+    return 0.6745 * (x - median) / mad
+
+
+def analyze(table, base=None, top=8, z_threshold=3.5):
+    # base: name of the line item ratios are taken against (e.g. 营业收入); None uses the total
+    values = table.values
+    items = np.array(table.items, dtype=object)
+    n_items, n_years = values.shape
+    if n_years < 2:
+        raise ValueError("need at least two periods to compare")
+    growth = growth_rates(values)
+    rates = cagr(values, table.years)
+    # growth between neighbouring columns is only year-over-year for consecutive years
+    year_numbers = _parse_years(table.years)
+    yearly = year_numbers is not None and bool(np.all(np.diff(year_numbers) == 1))
+    if base is not None:
+        if base not in table.items:
+            raise ValueError(f"no line item named {base!r}")
+        denominator = values[table.items.index(base)]
+        # the base line is the yardstick, not one of the things being added up
+        totals = np.nansum(np.delete(values, table.items.index(base), axis=0), axis=0)
+    else:
+        totals = np.nansum(values, axis=0)
+        denominator = totals
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = values / denominator
+    shares[~np.isfinite(shares)] = np.nan
+
+    last_change = values[:, -1] - values[:, -2]
+    movers = np.argsort(-np.nan_to_num(np.abs(last_change), nan=-1.0))[:top]
+    ranked_cagr = np.argsort(np.nan_to_num(rates, nan=-np.inf))
+    finite_cagr = np.isfinite(rates[ranked_cagr])
+    ranked_cagr = ranked_cagr[finite_cagr]
+
+    z = robust_z(growth)
+    flagged = np.argwhere(np.abs(np.nan_to_num(z)) > z_threshold)
+    order = np.argsort(-np.abs(z[flagged[:, 0], flagged[:, 1]])) if len(flagged) else []
+    anomalies = [(items[i], table.years[j], table.years[j + 1], values[i, j], values[i, j + 1], growth[i, j])
+                 for i, j in flagged[order][:top]]
+    # a value that changes sign (profit to loss, inflow to outflow) is worth a look on its own
+    flips = np.argwhere(np.sign(values[:, :-1]) * np.sign(values[:, 1:]) < 0)
+    sign_changes = [(items[i], table.years[j], table.years[j + 1], values[i, j], values[i, j + 1])
+                    for i, j in flips[:top]]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total_growth = np.diff(totals) / np.abs(totals[:-1])
+    return {
+        "years": list(table.years),
+        "items": n_items,
+        "missing": int(np.isnan(values).sum()),
+        "unparsed": list(table.unparsed),
+        "yearly": yearly,
+        "base": base or "合计",
+        "totals": totals.tolist(),
+        "total_growth": total_growth.tolist(),
+        "total_cagr": float(cagr(totals[None, :], table.years)[0]),
+        "movers": [(items[i], values[i, -2], values[i, -1], last_change[i], growth[i, -1], shares[i, -1])
+                   for i in movers if np.isfinite(last_change[i])],
+        "fastest": [(items[i], rates[i]) for i in ranked_cagr[::-1][:top]],
+        "slowest": [(items[i], rates[i]) for i in ranked_cagr[:top]],
+        "anomalies": anomalies,
+        "sign_changes": sign_changes,
+    }
+
+
+def _pct(x):
+    return "n/a" if x is None or not np.isfinite(x) else f"{x * 100:+.1f}%"
+
+
+def _num(x):
+    return "n/a" if not np.isfinite(x) else f"{x:,.4g}"
+
+
+def format_summary(summary):
+    # the compact text that goes into the prompt
+    years = summary["years"]
+    growth = "同比" if summary.get("yearly", True) else "环比"
+    missing = f"缺失值{summary['missing']}个"
+    if summary.get("unparsed"):
+        shown = "，".join(f"{item} {year}「{cell}」" for item, year, cell in summary["unparsed"][:3])
+        missing += f"（其中{len(summary['unparsed'])}个无法识别为数字，如 {shown}）"
+    lines = [f"期间：{years[0]}–{years[-1]}，共{summary['items']}个项目，{missing}。",
+             "合计：" + "，".join(f"{y} {_num(t)}" for y, t in zip(years, summary["totals"])) +
+             f"；{growth} " + "，".join(_pct(g) for g in summary["total_growth"]) +
+             f"；CAGR {_pct(summary['total_cagr'])}。"]
+    if summary["movers"]:
+        lines.append(f"{years[-2]}→{years[-1]} 变动最大的项目（占{summary['base']}比例为{years[-1]}）：")
+        lines += [f"- {name}: {_num(a)} → {_num(b)}（{_num(d)}，{_pct(g)}，占比 {_pct(s).lstrip('+')}）"
+                  for name, a, b, d, g, s in summary["movers"]]
+    if summary["fastest"]:
+        lines.append("CAGR 最高：" + "，".join(f"{name} {_pct(r)}" for name, r in summary["fastest"]))
+        lines.append("CAGR 最低：" + "，".join(f"{name} {_pct(r)}" for name, r in summary["slowest"]))
+    if summary["anomalies"]:
+        lines.append(f"异常波动（{growth}增速显著偏离其他项目）：")
+        lines += [f"- {name} {y0}→{y1}: {_num(a)} → {_num(b)}（{_pct(g)}）"
+                  for name, y0, y1, a, b, g in summary["anomalies"]]
+    if summary["sign_changes"]:
+        lines.append("正负号反转：" + "，".join(f"{name} {y0}→{y1} ({_num(a)} → {_num(b)})"
+                                                for name, y0, y1, a, b in summary["sign_changes"]))
+    return "\n".join(lines)
+
+
+def build_prompt(summary, question="请基于以下已计算好的指标分析公司的财务状况，指出趋势、风险和值得关注的异常。"):
+    return (f"{question}\n所有数字均已计算完毕，请直接引用，不要重新计算。\n\n{format_summary(summary)}")
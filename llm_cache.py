@@ -0,0 +1,134 @@
+# on-disk cache for LLM readings
+# 12 zodiac signs x 16 MBTI types is a small key space, so a repeat reading should
+# come from SQLite in milliseconds instead of a new generation
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import telemetry
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "ZODIAC_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".zodiac_cache"))
+
+
+def prompt_hash(template):
+    # short fingerprint of the prompt text, part of every cache key
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    def __init__(self, path=None, max_entries=5000, max_bytes=64 * 1024 * 1024,
+                 max_age=30 * 24 * 3600):
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, "responses.sqlite")
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " prompt_hash TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_prompt ON responses (prompt_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_access ON responses (last_access)")
+
+    @staticmethod
+    def make_key(model, inputs, template_hash):
+        # inputs are expected to be normalized already, e.g. ("天蝎座", "INFP")
+        raw = "\x1f".join([model, template_hash, *inputs])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, model, inputs, template_hash):
+        key = self.make_key(model, inputs, template_hash)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.max_age and now - row[1] > self.max_age):
+                self.misses += 1
+                if telemetry.ENABLED:
+                    telemetry.CACHE_LOOKUPS.inc(result="miss")
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            if telemetry.ENABLED:
+                telemetry.CACHE_LOOKUPS.inc(result="hit")
+            return row[0]
+
+    def put(self, model, inputs, template_hash, response):
+        key = self.make_key(model, inputs, template_hash)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, template_hash, response, len(response.encode("utf-8")), now, now))
+            self._evict(now)
+
+    def invalidate(self, template_hash=None, model=None):
+        # drop entries for one prompt version and/or one model, or everything
+        query, args = "DELETE FROM responses", []
+        conditions = []
+        if template_hash is not None:
+            conditions.append("prompt_hash = ?")
+            args.append(template_hash)
+        if model is not None:
+            conditions.append("model = ?")
+            args.append(model)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            return self._conn.execute(query, args).rowcount
+
+    def purge_stale(self, current_hash):
+        # the prompt text changed: everything generated from an older prompt is stale
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM responses WHERE prompt_hash != ?", (current_hash,)).rowcount
+
+    def _evict(self, now):
+        if self.max_age:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age,))
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if self.max_entries and count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if self.max_bytes and total > self.max_bytes:
+            # least recently used first until we are back under the byte budget
+            victims = []
+            for key, size in self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY last_access"):
+                if total <= self.max_bytes:
+                    break
+                victims.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": count, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,152 @@
+# latency-aware routing between several models
+# each request comes with a latency budget. the router keeps recent latencies per model and
+# picks the preferred model whose expected latency fits the budget, while holding back enough
+# time to fall back to a faster model. a model that runs out of its slice is cancelled (which
+# stops its generation), and when no model can answer in time a cached reading is returned
+# if there is one. a request never runs past its budget: it answers or raises DeadlineExceeded.
+import time
+from collections import deque, namedtuple
+
+from fate_ai import DeepSeekR1Model, normalize_inputs, PROMPT_HASH
+from think_filter import split_reasoning
+
+# source: "model" or "cache"; attempts: [(model name, outcome, seconds)] in the order tried
+RouteResult = namedtuple("RouteResult", ["text", "model", "source", "elapsed", "attempts"])
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, budget, attempts):
+        super().__init__(f"no answer within {budget:.2f}s (tried {', '.join(a[0] for a in attempts) or 'nothing'})")
+        self.budget = budget
+        self.attempts = attempts
+
+
+class LatencyStats:
+    # sliding window of end-to-end latencies of one model; timeouts are recorded with the time
+    # they were given, a lower bound that still pushes the estimate up
+    def __init__(self, window=50, prior=None):
+        self.samples = deque(maxlen=window)
+        self.prior = prior
+        self.timeouts = 0
+        self.failures = 0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def estimate(self, pct=90):
+        if not self.samples:
+            return self.prior
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class ModelRouter:
+    # models: model names from most preferred (usually the largest) to fastest, e.g.
+    # ["deepseek-r1:7b", "deepseek-r1:1.5b"]; priors: {name: expected seconds} used until
+    # real samples exist; safety: margin applied to estimates; fallback_share: part of the
+    # remaining time kept for a later model that has neither samples nor a prior yet
+    def __init__(self, models, client=None, cache=None, priors=None, percentile=90, safety=1.2, window=50,
+                 fallback_share=0.5):
+        priors = priors or {}
+        self.names = list(models)
+        self.cache = cache
+        self.percentile = percentile
+        self.safety = safety
+        self.fallback_share = fallback_share
+        self.models = {name: DeepSeekR1Model(name, cache=cache, client=client) for name in self.names}
+        self.stats = {name: LatencyStats(window, priors.get(name)) for name in self.names}
+
+    def expected(self, name):
+        estimate = self.stats[name].estimate(self.percentile)
+        return None if estimate is None else estimate * self.safety
+
+    def plan(self, budget):
+        # preferred models that are expected to fit, then the rest from fastest to slowest
+        fits = [n for n in self.names if (self.expected(n) or 0.0) <= budget]
+        rest = [n for n in reversed(self.names) if n not in fits]
+        return fits + rest
+
+    def cached(self, zodiac, mbti, hide_reasoning=True):
+        if self.cache is None:
+            return None
+        inputs = normalize_inputs(zodiac, mbti)
+        for name in self.names:
+            text = self.cache.get(name, inputs, PROMPT_HASH)
+            if text is not None:
+                return name, split_reasoning(text)[1] if hide_reasoning else text
+        return None
+
+    def _reserve_after(self, name, plan, remaining):
+        # time to keep for the fastest model that could still be tried after this one.
+        # slower models (or, when this one has no estimate, models that cannot fit) are last
+        # resorts and get no reservation; a later model nothing is known about yet is taken
+        # for a faster fallback and gets fallback_share of the remaining time
+        own = self.expected(name)
+        reserves = []
+        for later in plan[plan.index(name) + 1:]:
+            expected = self.expected(later)
+            if expected is None:
+                reserves.append(remaining * self.fallback_share)
+            elif expected < (remaining if own is None else own):
+                reserves.append(expected)
+        return min(reserves) if reserves else 0.0
+
+    async def analyze(self, zodiac, mbti, budget, hide_reasoning=True):
+        import asyncio
+
+        start = time.monotonic()
+        deadline = start + budget
+        hit = self.cached(zodiac, mbti, hide_reasoning)
+        if hit is not None:
+            return RouteResult(hit[1], hit[0], "cache", time.monotonic() - start, [])
+
+        attempts = []
+        plan = self.plan(budget)
+        for name in plan:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # give this model its slice, keeping time for a faster fallback when it is late
+            slice_ = remaining - self._reserve_after(name, plan, remaining)
+            if slice_ <= 0:
+                attempts.append((name, "skipped", 0.0))
+                continue
+            began = time.monotonic()
+            try:
+                text = await asyncio.wait_for(
+                    self.models[name].aanalyze_personality(zodiac, mbti, hide_reasoning), slice_)
+            except asyncio.TimeoutError:
+                self.stats[name].timeouts += 1
+                self.stats[name].record(time.monotonic() - began)
+                attempts.append((name, "timeout", time.monotonic() - began))
+                continue
+            except Exception:
+                self.stats[name].failures += 1
+                attempts.append((name, "error", time.monotonic() - began))
+                continue
+            took = time.monotonic() - began
+            self.stats[name].record(took)
+            attempts.append((name, "ok", took))
+            return RouteResult(text, name, "model", time.monotonic() - start, attempts)
+
+        # a fallback model may have finished and cached a reading for other callers meanwhile
+        hit = self.cached(zodiac, mbti, hide_reasoning)
+        if hit is not None:
+            return RouteResult(hit[1], hit[0], "cache", time.monotonic() - start, attempts)
+        raise DeadlineExceeded(budget, attempts)
+
+    def analyze_sync(self, zodiac, mbti, budget, hide_reasoning=True):
+        import asyncio
+
+        return asyncio.run(self.analyze(zodiac, mbti, budget, hide_reasoning))
+
+    def report(self):
+        return {
+            name: {
+                "expected_seconds": self.expected(name),
+                "samples": len(self.stats[name].samples),
+                "timeouts": self.stats[name].timeouts,
+                "failures": self.stats[name].failures,
+            }
+            for name in self.names
+        }
@@ -0,0 +1,157 @@
+# shared Ollama client layer
+# every script used to call the module-level ollama.chat, which opens a fresh connection
+# and lets the model unload after the server default idle time. this keeps one pooled
+# client per process, passes a keep_alive policy on every call and can preload the model.
+import os
+import threading
+import time
+import weakref
+
+import telemetry
+
+DEFAULT_KEEP_ALIVE = os.environ.get("ZODIAC_KEEP_ALIVE", "30m")
+
+
+class OllamaClient:
+    # host: None means OLLAMA_HOST or the ollama default, keep_alive: how long the server keeps
+    # the model loaded after a call ("30m", seconds, -1 forever, 0 unload right away)
+    def __init__(self, host=None, keep_alive=DEFAULT_KEEP_ALIVE, timeout=300,
+                 max_connections=16, max_keepalive_connections=8):
+        self.host = host or os.environ.get("OLLAMA_HOST")
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self._sync = None
+        # httpx async clients are bound to the event loop they were first used on
+        self._async = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _client_kwargs(self):
+        import httpx
+        return {
+            "host": self.host,
+            "timeout": self.timeout,
+            "limits": httpx.Limits(max_connections=self.max_connections,
+                                   max_keepalive_connections=self.max_keepalive_connections),
+        }
+
+    @property
+    def sync(self):
+        if self._sync is None:
+            with self._lock:
+                if self._sync is None:
+                    import ollama
+                    self._sync = ollama.Client(**self._client_kwargs())
+        return self._sync
+
+    @property
+    def async_client(self):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        client = self._async.get(loop)
+        if client is None:
+            import ollama
+            client = ollama.AsyncClient(**self._client_kwargs())
+            self._async[loop] = client
+        return client
+
+    def chat(self, model, messages, stream=False, **kwargs):
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        return self._observed(model, "chat", stream,
+                              lambda: self.sync.chat(model=model, messages=messages, stream=stream, **kwargs))
+
+    async def achat(self, model, messages, stream=False, **kwargs):
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        return await self._aobserved(model, "chat", stream,
+                                     lambda: self.async_client.chat(model=model, messages=messages,
+                                                                    stream=stream, **kwargs))
+
+    def generate(self, model, prompt, stream=False, **kwargs):
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        return self._observed(model, "generate", stream,
+                              lambda: self.sync.generate(model=model, prompt=prompt, stream=stream, **kwargs))
+
+    async def agenerate(self, model, prompt, stream=False, **kwargs):
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        return await self._aobserved(model, "generate", stream,
+                                     lambda: self.async_client.generate(model=model, prompt=prompt,
+                                                                        stream=stream, **kwargs))
+
+    # latency, TTFT and token counts of every call go to telemetry when it is enabled;
+    # otherwise the ollama response is returned untouched
+    def _observed(self, model, op, stream, call):
+        if not telemetry.ENABLED:
+            return call()
+        if not stream:
+            return telemetry.observe_call(model, op, call)
+        started = time.perf_counter()
+        return telemetry.observe_stream(model, op, started, call())
+
+    async def _aobserved(self, model, op, stream, call):
+        if not telemetry.ENABLED:
+            return await call()
+        if not stream:
+            return await telemetry.aobserve_call(model, op, call)
+        started = time.perf_counter()
+        return telemetry.aobserve_stream(model, op, started, await call())
+
+    def warm_up(self, model):
+        # an empty prompt makes the server load the model without generating anything;
+        # returns the wall-clock seconds, which is the load time if the model was cold
+        start = time.perf_counter()
+        self.generate(model, "")
+        return time.perf_counter() - start
+
+    async def awarm_up(self, model):
+        start = time.perf_counter()
+        await self.agenerate(model, "")
+        return time.perf_counter() - start
+
+    def unload(self, model):
+        self.generate(model, "", keep_alive=0)
+
+    def measure_cold_start(self, model, prompt="你好"):
+        # unload the model, then time the same short chat cold and warm
+        self.unload(model)
+        result = {}
+        for label in ("cold", "warm"):
+            start = time.perf_counter()
+            response = self.chat(model, [{"role": "user", "content": prompt}])
+            result[f"{label}_seconds"] = round(time.perf_counter() - start, 3)
+            # server-side model load time, in nanoseconds in the response
+            load = response.get("load_duration")
+            result[f"{label}_load_seconds"] = round(load / 1e9, 3) if load else 0.0
+        return result
+
+    def close(self):
+        if self._sync is not None:
+            self._sync._client.close()
+            self._sync = None
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_client():
+    # the process-wide client every DeepSeekR1Model uses unless it is given its own;
+    # with ZODIAC_CASSETTE set it records to / replays from that cassette (see cassette.py)
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                if os.environ.get("ZODIAC_CASSETTE"):
+                    from cassette import from_environment
+                    _shared = from_environment()
+                else:
+                    _shared = OllamaClient()
+    return _shared
+
+
+def set_client(client):
+    # swap the shared client, e.g. to point every model at another host
+    global _shared
+    with _shared_lock:
+        _shared = client
@@ -1,10 +1,33 @@
-from ollama import chat
-from ollama import ChatResponse
-
-response: ChatResponse = chat(model='deepseek-r1:1.5b', messages=[
-{
-'role': 'user',
-'content': '帮我分析公司的资本支出：2022年公司资本支出为30万元，2023年公司资本支出为35万元',
-},
-])
-print(response['message']['content'])
\ No newline at end of file
+import argparse
+
+from ollama_client import get_client
+
+# python print_response.py                         the capex example below
+# python print_response.py financials.csv          pre-analyse a multi-year table locally (numpy)
+#                          [--base 营业收入]        and send the model only the summary
+#                          [--show-prompt]
+
+parser = argparse.ArgumentParser(description="ask the model about company financials")
+parser.add_argument("csv", nargs="?", help="multi-year line items, see finance_analysis.py")
+parser.add_argument("--base", help="line item to compute shares against (default: the total)")
+parser.add_argument("--model", default="deepseek-r1:1.5b")
+parser.add_argument("--show-prompt", action="store_true", help="print the prompt and do not call the model")
+args = parser.parse_args()
+
+if args.csv:
+    import finance_analysis
+    summary = finance_analysis.analyze(finance_analysis.load_csv(args.csv), base=args.base)
+    content = finance_analysis.build_prompt(summary)
+else:
+    content = '帮我分析公司的资本支出：2022年公司资本支出为30万元，2023年公司资本支出为35万元'
+
+if args.show_prompt:
+    print(content)
+else:
+    response = get_client().chat(args.model, [
+    {
+    'role': 'user',
+    'content': content,
+    },
+    ])
+    print(response['message']['content'])
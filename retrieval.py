@@ -0,0 +1,136 @@
+# small lexical retrieval index (BM25) over local documents
+# used to put only the resume / interview paragraphs relevant to a job description into
+# the prompt, instead of both documents in full
+import json
+import math
+import re
+from collections import Counter, namedtuple
+
+# source: which document the chunk came from, text: the paragraph(s)
+Chunk = namedtuple("Chunk", ["source", "text"])
+
+_LATIN = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*[+#]*")
+_CJK_RUN = re.compile("[\u3400-\u4dbf\u4e00-\u9fff]+")
+_SENTENCE_END = re.compile("(?<=[。！？.!?;；])\\s*")
+
+
+def tokenize(text):
+    # latin words as-is, chinese as overlapping character bigrams (no segmenter needed)
+    text = text.lower()
+    tokens = _LATIN.findall(text)
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def chunk_text(text, max_chars=600, min_chars=120):
+    # paragraphs, short neighbours merged and long ones split on sentence ends
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        current = ""
+        for sentence in _SENTENCE_END.split(paragraph):
+            if current and len(current) + len(sentence) > max_chars:
+                pieces.append(current)
+                current = ""
+            current += sentence
+        if current:
+            pieces.append(current)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and (len(current) >= min_chars or len(current) + len(piece) > max_chars):
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class BM25Index:
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = [Chunk(*chunk) for chunk in chunks]
+        self.k1 = k1
+        self.b = b
+        # inverted index: term -> [(chunk id, term frequency)], so a query only touches
+        # the chunks that share a term with it
+        self.postings = {}
+        self.lengths = []
+        for chunk_id, chunk in enumerate(self.chunks):
+            counts = Counter(tokenize(chunk.text))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((chunk_id, tf))
+        n = len(self.chunks)
+        self.avg_length = (sum(self.lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    @classmethod
+    def from_documents(cls, documents, max_chars=600, **kwargs):
+        # documents: {source name: full text}
+        chunks = []
+        for source, text in documents.items():
+            chunks.extend(Chunk(source, piece) for piece in chunk_text(text or "", max_chars=max_chars))
+        return cls(chunks, **kwargs)
+
+    def _rank(self, query, k):
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf[term]
+            for chunk_id, tf in docs:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / (self.avg_length or 1))
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def search(self, query, k=4):
+        return [(score, self.chunks[chunk_id]) for chunk_id, score in self._rank(query, k)]
+
+    def _leading_chunks(self):
+        # the first chunk of every document, then the second ones, and so on
+        seen = Counter()
+        order = []
+        for chunk_id, chunk in enumerate(self.chunks):
+            order.append((seen[chunk.source], chunk_id))
+            seen[chunk.source] += 1
+        return [chunk_id for _, chunk_id in sorted(order)]
+
+    def top_k_text(self, query, k=4):
+        # the best chunks joined back in document order, ready to paste into a prompt.
+        # when fewer than k chunks share a term with the query (another language, an off-topic
+        # ad) the leading chunks of each document fill up, so the prompt never goes out empty
+        chunk_ids = {chunk_id for chunk_id, _ in self._rank(query, k)}
+        for chunk_id in self._leading_chunks():
+            if len(chunk_ids) >= k:
+                break
+            chunk_ids.add(chunk_id)
+        chunk_ids = sorted(chunk_ids)
+        return "\n\n".join(f"[{self.chunks[i].source}] {self.chunks[i].text}" for i in chunk_ids)
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "chunks": self.chunks}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["chunks"], k1=data["k1"], b=data["b"])
+
+    def __len__(self):
+        return len(self.chunks)
@@ -0,0 +1,166 @@
+# persistent per-user sessions for UserMemory
+# profiles and chat turns are written to a backend (SQLite by default, turns are append-only),
+# a UserMemory is loaded lazily on first access and idle ones are evicted from RAM (LRU),
+# so the number of users is bounded by disk, not by memory
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from llm_cache import DEFAULT_CACHE_DIR
+
+
+class MemorySessionBackend:
+    # keeps everything in dicts, for tests and throwaway sessions
+    def __init__(self):
+        self.profiles = {}
+        self.turns = {}
+
+    def load(self, user_id, max_turns):
+        turns = self.turns.get(user_id, [])
+        return self.profiles.get(user_id), turns[-max_turns:] if max_turns else list(turns)
+
+    def save_profile(self, user_id, profile):
+        self.profiles[user_id] = dict(profile)
+
+    def append_turn(self, user_id, user_input, agent_response):
+        self.turns.setdefault(user_id, []).append((user_input, agent_response))
+
+    def delete(self, user_id):
+        self.profiles.pop(user_id, None)
+        self.turns.pop(user_id, None)
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionBackend:
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, "sessions.sqlite")
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            " user_id TEXT PRIMARY KEY, profile TEXT NOT NULL, updated_at REAL NOT NULL)")
+        # append-only log of turns; (user_id, id) index makes "last N turns of a user" a range scan
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL,"
+            " created_at REAL NOT NULL, user_input TEXT NOT NULL, agent_response TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS turns_user ON turns (user_id, id)")
+
+    def load(self, user_id, max_turns):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT profile FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+            rows = self._conn.execute(
+                "SELECT user_input, agent_response FROM turns WHERE user_id = ?"
+                " ORDER BY id DESC LIMIT ?", (user_id, max_turns or -1)).fetchall()
+        rows.reverse()
+        return (json.loads(row[0]) if row else None), rows
+
+    def save_profile(self, user_id, profile):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?)",
+                (user_id, json.dumps(profile, ensure_ascii=False), time.time()))
+
+    def append_turn(self, user_id, user_input, agent_response):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO turns (user_id, created_at, user_input, agent_response) VALUES (?, ?, ?, ?)",
+                (user_id, time.time(), user_input, agent_response))
+
+    def delete(self, user_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM profiles WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM turns WHERE user_id = ?", (user_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _default_memory():
+    from fate_ai import UserMemory
+    return UserMemory()
+
+
+class SessionStore:
+    # capacity: how many UserMemory objects stay in RAM, idle_timeout: seconds without access
+    # before a session may be dropped from RAM (it is still on disk and reloads on next access)
+    def __init__(self, backend=None, capacity=10000, idle_timeout=1800, memory_factory=_default_memory):
+        self.backend = backend if backend is not None else SQLiteSessionBackend()
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.memory_factory = memory_factory
+        self._sessions = OrderedDict()   # user_id -> (memory, last_access), oldest first
+        self._lock = threading.RLock()
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            if entry is not None:
+                self._sessions[user_id] = (entry[0], now)
+                self._sessions.move_to_end(user_id)
+                return entry[0]
+            memory = self.memory_factory()
+            profile, turns = self.backend.load(user_id, getattr(memory.history, "max_turns", None))
+            if profile:
+                memory.profile = profile
+            for turn in turns:
+                memory.history.append(tuple(turn))
+            self.loads += 1
+            self._sessions[user_id] = (memory, now)
+            self._evict(now)
+            return memory
+
+    def update_profile(self, user_id, **profile):
+        memory = self.get(user_id)
+        memory.update_profile(**profile)
+        self.backend.save_profile(user_id, memory.profile)
+        return memory
+
+    def remember(self, user_id, user_input, agent_response):
+        memory = self.get(user_id)
+        memory.remember(user_input, agent_response)
+        self.backend.append_turn(user_id, user_input, agent_response)
+        return memory
+
+    def forget(self, user_id):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+        self.backend.delete(user_id)
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict(time.monotonic())
+
+    def _evict(self, now):
+        # LRU order: the front of the OrderedDict is the least recently used session
+        while self._sessions:
+            user_id, (_, last_access) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.capacity and now - last_access < self.idle_timeout:
+                break
+            del self._sessions[user_id]
+            self.evictions += 1
+
+    def __contains__(self, user_id):
+        return user_id in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def close(self):
+        self.backend.close()
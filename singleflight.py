@@ -0,0 +1,152 @@
+# single-flight coalescing of identical streamed requests
+# the first caller for a key starts the generation, callers that arrive while it is running
+# attach to it: they first get the parts produced so far, then the live ones.
+# a subscriber that stops reading only detaches; the generation is stopped when the last
+# subscriber is gone.
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.parts = []          # everything produced so far, replayed to late subscribers
+        self.finished = False
+        self.error = None
+        self.subscribers = 1     # the caller that creates the flight is its first subscriber
+        self.abandoned = False
+        self.cond = threading.Condition()
+        self.task = None         # asyncio only: the producer task
+
+
+class SingleFlight:
+    # for blocking generators: the producer runs in a daemon thread
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self):
+        return len(self._flights)
+
+    def stream(self, key, start):
+        # start() returns the iterator to share; only called if no flight for key is running
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                threading.Thread(target=self._produce, args=(key, flight, start), daemon=True).start()
+            else:
+                with flight.cond:
+                    flight.subscribers += 1
+        return self._subscribe(key, flight)
+
+    def _produce(self, key, flight, start):
+        iterator = None
+        try:
+            iterator = start()
+            for part in iterator:
+                with flight.cond:
+                    if flight.abandoned:
+                        break
+                    flight.parts.append(part)
+                    flight.cond.notify_all()
+        except BaseException as exc:
+            flight.error = exc
+        finally:
+            if iterator is not None and hasattr(iterator, "close"):
+                iterator.close()
+            self._forget(key, flight)
+            with flight.cond:
+                flight.finished = True
+                flight.cond.notify_all()
+
+    def _subscribe(self, key, flight):
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    flight.cond.wait_for(lambda: index < len(flight.parts) or flight.finished)
+                    parts = flight.parts[index:]
+                    finished = flight.finished
+                index += len(parts)
+                yield from parts
+                if finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            with flight.cond:
+                flight.subscribers -= 1
+                last = flight.subscribers == 0 and not flight.finished
+                if last:
+                    flight.abandoned = True
+            if last:
+                # nobody is listening any more, the next caller starts a fresh generation
+                self._forget(key, flight)
+
+    def _forget(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+
+class AsyncSingleFlight:
+    # same for async iterators: the producer is a task on the running event loop
+    def __init__(self):
+        self._flights = {}
+
+    def in_flight(self):
+        return len(self._flights)
+
+    async def stream(self, key, start):
+        import asyncio
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.cond = asyncio.Condition()
+            flight.task = asyncio.create_task(self._produce(key, flight, start))
+        else:
+            flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                async with flight.cond:
+                    await flight.cond.wait_for(lambda: index < len(flight.parts) or flight.finished)
+                parts = flight.parts[index:]
+                finished = flight.finished
+                index += len(parts)
+                for part in parts:
+                    yield part
+                if finished and index >= len(flight.parts):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.finished:
+                # cancelling the task closes the upstream response and stops the generation
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    async def _produce(self, key, flight, start):
+        iterator = None
+        try:
+            iterator = start()
+            async for part in iterator:
+                async with flight.cond:
+                    flight.parts.append(part)
+                    flight.cond.notify_all()
+        except Exception as exc:
+            flight.error = exc
+        finally:
+            if iterator is not None and hasattr(iterator, "aclose"):
+                await iterator.aclose()
+            self._forget(key, flight)
+            flight.finished = True
+            # wake whoever is still waiting for the end of the stream
+            if flight.subscribers:
+                async with flight.cond:
+                    flight.cond.notify_all()
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,420 @@
+# metrics and tracing for LLM calls
+# every model call goes through ollama_client, which records latency, time to first token and
+# token counts here; the response cache records hits and misses, the HTTP service its queues.
+# metrics are rendered in the Prometheus text format, spans are OpenTelemetry-style dicts
+# handed to exporters (a JSON-lines file, or the opentelemetry SDK when it is installed).
+#
+# everything is off unless ZODIAC_METRICS=1 or enable() is called. when off, the callers only
+# check ENABLED and hand back the raw ollama response, so the cost is one attribute lookup.
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("ZODIAC_METRICS", "") not in ("", "0")
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = flag
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (not cumulative), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            running = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                running += bucket_count
+                le = _labels(self.label_names, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{le} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collect):
+        # collect() is called right before rendering, to refresh gauges such as queue depth
+        # from their source instead of updating them on every change
+        self.collectors.append(collect)
+
+    def render(self):
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+LLM_REQUESTS = REGISTRY.counter("zodiac_llm_requests_total", "LLM calls by outcome",
+                                ("model", "op", "outcome"))
+LLM_LATENCY = REGISTRY.histogram("zodiac_llm_request_seconds", "wall-clock time of LLM calls",
+                                 ("model", "op"))
+LLM_TTFT = REGISTRY.histogram("zodiac_llm_ttft_seconds", "time to the first streamed token",
+                              ("model", "op"))
+LLM_TOKENS = REGISTRY.counter("zodiac_llm_tokens_total", "prompt and completion tokens",
+                              ("model", "kind"))
+CACHE_LOOKUPS = REGISTRY.counter("zodiac_cache_lookups_total", "response cache lookups",
+                                 ("result",))
+QUEUE_DEPTH = REGISTRY.gauge("zodiac_queue_depth", "requests waiting for a worker", ("model",))
+ACTIVE_WORKERS = REGISTRY.gauge("zodiac_active_workers", "generations running", ("model",))
+
+
+def render():
+    return REGISTRY.render()
+
+
+# -- spans -----------------------------------------------------------------------
+
+_current_span = contextvars.ContextVar("zodiac_span", default=None)
+_exporters = []
+
+
+def add_span_exporter(export):
+    # export(span_dict) is called for every finished span
+    _exporters.append(export)
+
+
+def remove_span_exporter(export):
+    if export in _exporters:
+        _exporters.remove(export)
+
+
+class JsonLinesExporter:
+    # appends one JSON object per finished span to a file
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        line = json.dumps(span, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class OpenTelemetryExporter:
+    # replays finished spans through an opentelemetry tracer (needs opentelemetry-api and a
+    # configured SDK); imported lazily so the package stays optional
+    def __init__(self, tracer_name="zodiac"):
+        from opentelemetry import trace
+        self._tracer = trace.get_tracer(tracer_name)
+
+    def __call__(self, span):
+        otel_span = self._tracer.start_span(span["name"], start_time=span["start_time_unix_nano"],
+                                            attributes=span["attributes"])
+        if span["status"] == "ERROR":
+            from opentelemetry.trace import Status, StatusCode
+            otel_span.set_status(Status(StatusCode.ERROR, span.get("error")))
+        otel_span.end(end_time=span["end_time_unix_nano"])
+
+
+class Span:
+    def __init__(self, name, attributes):
+        parent = _current_span.get()
+        self.name = name
+        self.attributes = dict(attributes)
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time_ns()
+        self.error = None
+        self._token = None
+        self._ended = False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def fail(self, exc):
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is not None:
+            _current_span.reset(self._token)
+        if exc is not None:
+            self.fail(exc)
+        self.end()
+        return False
+
+    def end(self):
+        if self._ended:
+            return
+        self._ended = True
+        record = {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time_unix_nano": self.start,
+            "end_time_unix_nano": time.time_ns(),
+            "attributes": self.attributes,
+            "status": "ERROR" if self.error else "OK",
+        }
+        if self.error:
+            record["error"] = self.error
+        for export in list(_exporters):
+            export(record)
+
+
+class _NoSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def fail(self, exc):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def end(self):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, **attributes):
+    # with telemetry.span("zodiac.analyze", model=...) as s: ...
+    # nested spans share the trace id; nothing is allocated while telemetry is disabled
+    if not ENABLED or not _exporters:
+        return _NO_SPAN
+    return Span(name, attributes)
+
+
+# -- LLM call instrumentation ------------------------------------------------------
+
+def _record_usage(model, response):
+    prompt = response.get("prompt_eval_count") if response is not None else None
+    completion = response.get("eval_count") if response is not None else None
+    if prompt:
+        LLM_TOKENS.inc(prompt, model=model, kind="prompt")
+    if completion:
+        LLM_TOKENS.inc(completion, model=model, kind="completion")
+    return prompt, completion
+
+
+def _finish(model, op, started, outcome, last, call_span, first=None):
+    elapsed = time.perf_counter() - started
+    LLM_LATENCY.observe(elapsed, model=model, op=op)
+    LLM_REQUESTS.inc(model=model, op=op, outcome=outcome)
+    if first is not None:
+        LLM_TTFT.observe(first - started, model=model, op=op)
+    prompt, completion = _record_usage(model, last) if outcome == "ok" else (None, None)
+    call_span.set_attribute("llm.outcome", outcome)
+    if first is not None:
+        call_span.set_attribute("llm.ttft_seconds", round(first - started, 6))
+    if prompt:
+        call_span.set_attribute("llm.prompt_tokens", prompt)
+    if completion:
+        call_span.set_attribute("llm.completion_tokens", completion)
+    call_span.end()
+
+
+def _start_span(model, op):
+    # not entered as a context manager: a streamed call ends when its stream does
+    return span(f"llm.{op}", **{"llm.model": model, "llm.operation": op})
+
+
+def observe_call(model, op, call):
+    # call() performs a blocking, non-streamed request
+    started = time.perf_counter()
+    call_span = _start_span(model, op)
+    try:
+        response = call()
+    except BaseException as exc:
+        call_span.fail(exc)
+        _finish(model, op, started, "error", None, call_span)
+        raise
+    _finish(model, op, started, "ok", response, call_span)
+    return response
+
+
+async def aobserve_call(model, op, call):
+    started = time.perf_counter()
+    call_span = _start_span(model, op)
+    try:
+        response = await call()
+    except BaseException as exc:
+        call_span.fail(exc)
+        _finish(model, op, started, "error", None, call_span)
+        raise
+    _finish(model, op, started, "ok", response, call_span)
+    return response
+
+
+def observe_stream(model, op, started, parts):
+    # wraps a streamed response; a stream closed before its done part counts as "cancelled"
+    call_span = _start_span(model, op)
+    first = last = None
+    outcome = "cancelled"
+    try:
+        for part in parts:
+            if first is None:
+                first = time.perf_counter()
+            last = part
+            yield part
+        outcome = "ok"
+    except GeneratorExit:
+        raise
+    except BaseException as exc:
+        outcome = "error"
+        call_span.fail(exc)
+        raise
+    finally:
+        if hasattr(parts, "close"):
+            parts.close()
+        _finish(model, op, started, outcome, last, call_span, first)
+
+
+async def aobserve_stream(model, op, started, parts):
+    call_span = _start_span(model, op)
+    first = last = None
+    outcome = "cancelled"
+    try:
+        async for part in parts:
+            if first is None:
+                first = time.perf_counter()
+            last = part
+            yield part
+        outcome = "ok"
+    except GeneratorExit:
+        raise
+    except BaseException as exc:
+        # CancelledError is a BaseException too: a deadline that stops the stream
+        outcome = "cancelled" if type(exc).__name__ == "CancelledError" else "error"
+        if outcome == "error":
+            call_span.fail(exc)
+        raise
+    finally:
+        if hasattr(parts, "aclose"):
+            await parts.aclose()
+        _finish(model, op, started, outcome, last, call_span, first)
@@ -0,0 +1,61 @@
+# record against fake_ollama.FakeOllamaServer, stop it, replay from the cassette
+#
+#   python -m pytest -q test_cassette.py
+import asyncio
+
+import pytest
+
+from cassette import CassetteClient, CassetteMiss
+from fake_ollama import FakeOllamaConfig, FakeOllamaServer
+from fate_ai import DeepSeekR1Model, UserMemory
+from ollama_client import OllamaClient
+
+
+def conversation(client):
+    # one of every kind of call fate_ai makes: chat in one piece and streamed, sync and
+    # async, and a two-turn generate session that sends the model context back
+    blocking = DeepSeekR1Model(client=client, coalesce=False)
+    streaming = DeepSeekR1Model(client=client)
+    results = {
+        "chat": blocking.analyze_personality("天蝎座", "INFP"),
+        "chat_stream": [(chunk.text, chunk.kind) for chunk in streaming.stream_personality("白羊座", "ENTJ")],
+    }
+
+    async def async_calls():
+        achat = await blocking.aanalyze_personality("双鱼座", "ISFP", hide_reasoning=True)
+        astream = [(chunk.text, chunk.kind)
+                   async for chunk in streaming.astream_personality("狮子座", "ESFJ", hide_reasoning=True)]
+        return achat, astream
+
+    results["achat"], results["achat_stream"] = asyncio.run(async_calls())
+    session = streaming.chat_session(UserMemory())
+    results["session"] = [session.send("我适合做什么工作？"), session.send("那感情方面呢？")]
+    results["session_context_turns"] = session.context_turns
+    return results
+
+
+def test_replay_matches_the_recording_without_a_server(tmp_path):
+    path = str(tmp_path / "calls.jsonl.gz")
+    with FakeOllamaServer(FakeOllamaConfig(tokens=80, token_rate=5000, first_token_delay=0.0)) as server:
+        inner = OllamaClient(host=server.url)
+        recorded = conversation(CassetteClient(path, mode="record", inner=inner))
+        inner.close()
+        requests = server.requests
+    assert recorded["session_context_turns"] == 1
+
+    replaying = CassetteClient(path, mode="replay")
+    assert len(replaying.cassette) == requests
+    assert conversation(replaying) == recorded
+
+
+def test_replay_of_an_unknown_request_raises(tmp_path):
+    path = str(tmp_path / "calls.jsonl")
+    with FakeOllamaServer(FakeOllamaConfig(tokens=20, token_rate=5000, first_token_delay=0.0)) as server:
+        inner = OllamaClient(host=server.url)
+        DeepSeekR1Model(client=CassetteClient(path, mode="record", inner=inner)).analyze_personality("天蝎座", "INFP")
+        inner.close()
+
+    model = DeepSeekR1Model(client=CassetteClient(path, mode="replay"))
+    assert model.analyze_personality("天蝎座", "INFP")
+    with pytest.raises(CassetteMiss):
+        model.analyze_personality("白羊座", "ENTJ")
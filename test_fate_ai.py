@@ -0,0 +1,48 @@
+# tests for fate_ai against fake_ollama.FakeOllamaServer (no model needed)
+#
+#   python -m pytest -q test_fate_ai.py
+import asyncio
+
+import pytest
+
+from fake_ollama import FakeOllamaConfig, FakeOllamaServer
+from fate_ai import DeepSeekR1Model
+from llm_cache import ResponseCache
+from ollama_client import OllamaClient
+
+
+@pytest.fixture
+def server():
+    with FakeOllamaServer(FakeOllamaConfig(tokens=60, token_rate=5000, first_token_delay=0.0)) as server:
+        yield server
+
+
+@pytest.fixture
+def model(server, tmp_path):
+    client = OllamaClient(host=server.url)
+    yield DeepSeekR1Model(cache=ResponseCache(str(tmp_path / "responses.sqlite")), client=client)
+    client.close()
+
+
+def test_reasoning_cap_does_not_apply_to_a_cached_reading(model, server):
+    reading = model.analyze_personality("天蝎座", "INFP")
+    assert reading.startswith("<think>")
+    assert server.requests == 1
+
+    for mode in ("abort", "reprompt"):
+        chunks = list(model.stream_personality("天蝎座", "INFP", max_reasoning_tokens=5, on_reasoning_limit=mode))
+        assert chunks[-1].done
+    assert model.analyze_personality("天蝎座", "INFP", max_reasoning_tokens=5) == reading
+
+    async def astream():
+        return [chunk async for chunk in model.astream_personality("天蝎座", "INFP", max_reasoning_tokens=5)]
+
+    assert asyncio.run(astream())[-1].done
+    assert server.requests == 1
+
+
+def test_reasoning_cap_still_applies_to_a_live_generation(model):
+    from think_filter import ReasoningLimitExceeded
+
+    with pytest.raises(ReasoningLimitExceeded):
+        list(model.stream_personality("天蝎座", "INFP", max_reasoning_tokens=5))
@@ -0,0 +1,136 @@
+# tests for singleflight: late joiners, one subscriber detaching, error fan-out
+#
+#   python -m pytest -q test_singleflight.py
+import asyncio
+import threading
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+class Boom(Exception):
+    pass
+
+
+def gated_parts(gate, parts, error=None, started=None):
+    # yields parts[0], then waits for gate before the rest (and the error, if any)
+    def start():
+        if started is not None:
+            started.append(1)
+        yield parts[0]
+        assert gate.wait(5)
+        yield from parts[1:]
+        if error is not None:
+            raise error
+    return start
+
+
+def test_late_joiner_gets_parts_produced_before_it_joined():
+    flights = SingleFlight()
+    gate = threading.Event()
+    started = []
+    first = flights.stream("k", gated_parts(gate, ["a", "b", "c"], started=started))
+    assert next(first) == "a"
+    late = flights.stream("k", gated_parts(gate, ["x"], started=started))
+    gate.set()
+    assert list(first) == ["b", "c"]
+    assert list(late) == ["a", "b", "c"]
+    assert started == [1]
+    assert flights.in_flight() == 0
+
+
+def test_detaching_subscriber_does_not_stop_the_others():
+    flights = SingleFlight()
+    gate = threading.Event()
+    first = flights.stream("k", gated_parts(gate, ["a", "b", "c"]))
+    second = flights.stream("k", gated_parts(gate, ["x"]))
+    assert next(first) == "a"
+    first.close()
+    gate.set()
+    assert list(second) == ["a", "b", "c"]
+
+
+def test_last_subscriber_leaving_abandons_the_flight():
+    flights = SingleFlight()
+    gate = threading.Event()
+    only = flights.stream("k", gated_parts(gate, ["a", "b"]))
+    assert next(only) == "a"
+    only.close()
+    assert flights.in_flight() == 0
+    gate.set()
+    # the next caller starts a fresh generation
+    assert list(flights.stream("k", lambda: iter(["new"]))) == ["new"]
+
+
+def test_error_reaches_every_subscriber():
+    flights = SingleFlight()
+    gate = threading.Event()
+    first = flights.stream("k", gated_parts(gate, ["a", "b"], error=Boom("upstream")))
+    assert next(first) == "a"
+    second = flights.stream("k", gated_parts(gate, ["x"]))
+    gate.set()
+    for subscriber, expected in ((first, ["b"]), (second, ["a", "b"])):
+        received = []
+        with pytest.raises(Boom):
+            for part in subscriber:
+                received.append(part)
+        assert received == expected
+
+
+def agated_parts(gate, parts, error=None, started=None):
+    def start():
+        async def produce():
+            if started is not None:
+                started.append(1)
+            yield parts[0]
+            await gate.wait()
+            for part in parts[1:]:
+                yield part
+            if error is not None:
+                raise error
+        return produce()
+    return start
+
+
+# an async subscriber joins the flight on its first __anext__, not when stream() is called
+async def collect(stream):
+    return [part async for part in stream]
+
+
+def test_async_late_joiner_and_detach():
+    async def scenario():
+        flights = AsyncSingleFlight()
+        gate = asyncio.Event()
+        started = []
+        first = flights.stream("k", agated_parts(gate, ["a", "b", "c"], started=started))
+        assert await first.__anext__() == "a"
+        late = flights.stream("k", agated_parts(gate, ["x"], started=started))
+        assert await late.__anext__() == "a"
+        leaving = flights.stream("k", agated_parts(gate, ["x"], started=started))
+        assert await leaving.__anext__() == "a"
+        await leaving.aclose()
+        gate.set()
+        assert await collect(first) == ["b", "c"]
+        assert await collect(late) == ["b", "c"]
+        assert started == [1]
+        assert flights.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_async_error_reaches_every_subscriber():
+    async def scenario():
+        flights = AsyncSingleFlight()
+        gate = asyncio.Event()
+        first = flights.stream("k", agated_parts(gate, ["a"], error=Boom("upstream")))
+        assert await first.__anext__() == "a"
+        second = flights.stream("k", agated_parts(gate, ["x"]))
+        assert await second.__anext__() == "a"
+        gate.set()
+        with pytest.raises(Boom):
+            await collect(first)
+        with pytest.raises(Boom):
+            await collect(second)
+
+    asyncio.run(scenario())
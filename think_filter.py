@@ -0,0 +1,86 @@
+# incremental parser for deepseek-r1 output
+# the model writes "<think>reasoning</think>answer"; tokens arrive a few characters at a time
+# and a tag can be split across chunks, so this keeps a small tail buffer between feeds
+from conversation import estimate_tokens
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+class ReasoningLimitExceeded(Exception):
+    def __init__(self, reasoning_tokens, limit):
+        super().__init__(f"reasoning used ~{reasoning_tokens} tokens, limit is {limit}")
+        self.reasoning_tokens = reasoning_tokens
+        self.limit = limit
+
+
+def _partial_tag_length(text, tag):
+    # length of the longest suffix of text that is a prefix of tag
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if tag.startswith(text[-size:]):
+            return size
+    return 0
+
+
+class ThinkFilter:
+    # feed() takes raw chunks and returns [(kind, text)] with kind "reasoning" or "answer";
+    # max_reasoning_tokens: raise ReasoningLimitExceeded once the reasoning grows past it
+    def __init__(self, max_reasoning_tokens=None):
+        self.max_reasoning_tokens = max_reasoning_tokens
+        self.in_reasoning = False
+        self.reasoning_tokens = 0
+        self._pending = ""
+        self._answer_started = False
+
+    def feed(self, text):
+        buffer = self._pending + text
+        self._pending = ""
+        out = []
+        while buffer:
+            tag = THINK_CLOSE if self.in_reasoning else THINK_OPEN
+            index = buffer.find(tag)
+            if index >= 0:
+                self._emit(out, buffer[:index])
+                buffer = buffer[index + len(tag):]
+                self.in_reasoning = not self.in_reasoning
+                continue
+            keep = _partial_tag_length(buffer, tag)
+            if keep:
+                self._pending = buffer[-keep:]
+                buffer = buffer[:-keep]
+            self._emit(out, buffer)
+            break
+        return out
+
+    def flush(self):
+        # end of stream: whatever is still buffered was not a tag after all
+        out = []
+        self._emit(out, self._pending)
+        self._pending = ""
+        return out
+
+    def _emit(self, out, text):
+        if not text:
+            return
+        if self.in_reasoning:
+            self.reasoning_tokens += estimate_tokens(text)
+            out.append(("reasoning", text))
+            if self.max_reasoning_tokens is not None and self.reasoning_tokens > self.max_reasoning_tokens:
+                raise ReasoningLimitExceeded(self.reasoning_tokens, self.max_reasoning_tokens)
+            return
+        if not self._answer_started:
+            # the answer usually starts with the blank lines that followed </think>
+            text = text.lstrip()
+            if not text:
+                return
+            self._answer_started = True
+        out.append(("answer", text))
+
+
+def split_reasoning(text):
+    # whole-text version: returns (reasoning, answer)
+    parser = ThinkFilter()
+    pieces = parser.feed(text) + parser.flush()
+    reasoning = "".join(piece for kind, piece in pieces if kind == "reasoning")
+    answer = "".join(piece for kind, piece in pieces if kind == "answer")
+    return reasoning, answer
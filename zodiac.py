@@ -0,0 +1,223 @@
+# command line entry point for the AI scripts
+#
+#   python zodiac.py analyze 天蝎座 infp
+#   python zodiac.py coverletter job.txt --resume resume.docx
+#   python zodiac.py coverletters jobs/ --resume resume.docx --out letters/
+#   python zodiac.py ask "我适合做什么工作？" --user gary --zodiac 天蝎座 --mbti INFP
+#
+# only argparse is imported up front: fate_ai / coverletter_ai are imported by the
+# subcommand that needs them, ollama and python-docx only when a model call or a
+# document parse actually happens, so --help and cache hits stay fast
+import argparse
+import os
+import sys
+
+DEFAULT_MODEL = "deepseek-r1:1.5b"
+
+
+def _print_chunks(chunks, show_timing):
+    from fate_ai import display_text
+
+    last = None
+    for chunk, text in display_text(chunks):
+        print(text, end="", flush=True)
+        last = chunk
+    print()
+    if show_timing and last is not None and last.ttft is not None:
+        print(f"[ttft {last.ttft:.3f}s, total {last.elapsed:.3f}s]", file=sys.stderr)
+    return last
+
+
+def cmd_analyze(args):
+    from fate_ai import DeepSeekR1Model
+    from llm_cache import ResponseCache
+
+    cache = None if args.no_cache else ResponseCache()
+    if args.budget is not None:
+        return _routed_analyze(args, cache)
+    model = DeepSeekR1Model(args.model, cache=cache)
+    if args.no_stream:
+        print(model.analyze_personality(args.zodiac, args.mbti, hide_reasoning=args.hide_reasoning,
+                                        max_reasoning_tokens=args.max_reasoning_tokens))
+        return 0
+    _print_chunks(model.stream_personality(args.zodiac, args.mbti, args.hide_reasoning,
+                                           args.max_reasoning_tokens, args.on_reasoning_limit),
+                  args.timing)
+    return 0
+
+
+def _routed_analyze(args, cache):
+    from model_router import DeadlineExceeded, ModelRouter
+
+    router = ModelRouter([args.model] + args.fallback, cache=cache, priors=dict(args.prior))
+    try:
+        result = router.analyze_sync(args.zodiac, args.mbti, args.budget, args.hide_reasoning)
+    except DeadlineExceeded as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    print(result.text)
+    if args.timing:
+        print(f"[{result.source} {result.model}, total {result.elapsed:.3f}s]", file=sys.stderr)
+    return 0
+
+
+def _prior(value):
+    # MODEL=SECONDS for --prior
+    name, _, seconds = value.rpartition("=")
+    try:
+        return name, float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected MODEL=SECONDS, got {value!r}")
+
+
+def cmd_coverletter(args):
+    from coverletter_ai import DeepSeekR1Model, UserMemory, compare_cover_letter_prompts, read_document
+
+    job_description = sys.stdin.read() if args.job == "-" else read_document(args.job)
+    memory = UserMemory(args.resume, args.interview)
+    model = DeepSeekR1Model(args.model)
+    if args.report:
+        import json
+        from coverletter_ai import document_cache_stats
+        report = compare_cover_letter_prompts(model, memory, job_description, args.top_k)
+        report["document_cache"] = document_cache_stats()
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 0
+    top_k = None if args.full else args.top_k
+    print(model.write_cover_letter(memory, job_description, top_k))
+    return 0
+
+
+def cmd_coverletters(args):
+    from coverletter_batch import run_pipeline
+
+    def report(result):
+        name = os.path.basename(result.job)
+        if result.status == "failed":
+            print(f"failed   {name}: {result.error}", file=sys.stderr)
+        else:
+            print(f"{result.status:<8} {name} -> {result.output} ({result.elapsed:.1f}s)")
+
+    results = run_pipeline(args.jobs, args.out, args.resume, args.interview, args.model, args.top_k,
+                           args.concurrency, args.workers, report)
+    counts = {status: sum(r.status == status for r in results) for status in ("written", "skipped", "failed")}
+    print(", ".join(f"{count} {status}" for status, count in counts.items()))
+    return 1 if counts["failed"] else 0
+
+
+def cmd_ask(args):
+    from fate_ai import DeepSeekR1Model, display_text
+
+    model = DeepSeekR1Model(args.model)
+    store = memory = None
+    if args.user:
+        from session_store import SessionStore
+        store = SessionStore()
+        memory = store.get(args.user)
+        if args.zodiac or args.mbti or args.gender:
+            profile = dict(memory.profile)
+            for key in ("zodiac", "mbti", "gender"):
+                profile[key] = getattr(args, key) or profile.get(key)
+            memory = store.update_profile(args.user, **profile)
+    chunks = []
+    for chunk, text in display_text(model.stream_ask(args.question, memory, hide_reasoning=not args.show_reasoning)):
+        chunks.append(chunk)
+        print(text, end="", flush=True)
+    print()
+    if store is not None:
+        answer = "".join(chunk.text for chunk in chunks if chunk.kind == "answer")
+        store.remember(args.user, args.question, answer)
+        store.close()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="zodiac", description="Astra: zodiac x MBTI readings and cover letters")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"ollama model tag (default {DEFAULT_MODEL})")
+    parser.add_argument("--metrics", action="store_true",
+                        help="print LLM call metrics (Prometheus text format) to stderr at exit")
+    parser.add_argument("--trace", metavar="FILE", help="append finished spans to FILE as JSON lines")
+    parser.add_argument("--record", metavar="CASSETTE", help="record every model call to CASSETTE")
+    parser.add_argument("--replay", metavar="CASSETTE", help="answer model calls from CASSETTE, no server needed")
+    parser.add_argument("--pace", type=float, default=0.0,
+                        help="with --replay: 0 instant (default), 1 at the recorded speed")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    analyze = commands.add_parser("analyze", help="personality reading for a zodiac sign and MBTI type")
+    analyze.add_argument("zodiac")
+    analyze.add_argument("mbti")
+    analyze.add_argument("--no-cache", action="store_true", help="always ask the model")
+    analyze.add_argument("--no-stream", action="store_true", help="print the reading when it is complete")
+    analyze.add_argument("--hide-reasoning", action="store_true", help="do not print the <think> section")
+    analyze.add_argument("--max-reasoning-tokens", type=int, default=None)
+    analyze.add_argument("--on-reasoning-limit", choices=("abort", "reprompt"), default="reprompt")
+    analyze.add_argument("--timing", action="store_true", help="print TTFT and total time to stderr")
+    analyze.add_argument("--budget", type=float, default=None,
+                         help="answer within this many seconds, falling back to faster models or the cache")
+    analyze.add_argument("--fallback", action="append", default=[], metavar="MODEL",
+                         help="faster model to use when --model would miss the budget (repeatable)")
+    analyze.add_argument("--prior", action="append", default=[], type=_prior, metavar="MODEL=SECONDS",
+                         help="expected latency of a model for --budget, e.g. deepseek-r1:7b=8 (repeatable)")
+    analyze.set_defaults(func=cmd_analyze)
+
+    coverletter = commands.add_parser("coverletter", help="cover letter for a job description")
+    coverletter.add_argument("job", help="job description (.docx, text file, or - for stdin)")
+    coverletter.add_argument("--resume", help="resume .docx (default $ZODIAC_RESUME)")
+    coverletter.add_argument("--interview", help="interview notes .docx (default $ZODIAC_INTERVIEW)")
+    coverletter.add_argument("--top-k", type=int, default=4, help="resume paragraphs put into the prompt")
+    coverletter.add_argument("--full", action="store_true", help="send the whole resume instead")
+    coverletter.add_argument("--report", action="store_true",
+                             help="compare prompt size and latency of full vs retrieved background, with document cache stats")
+    coverletter.set_defaults(func=cmd_coverletter)
+
+    coverletters = commands.add_parser("coverletters", help="one cover letter per job description in a folder")
+    coverletters.add_argument("jobs", help="folder of job descriptions (.docx, .txt, .md)")
+    coverletters.add_argument("--out", required=True, help="folder for the letters; rerun to resume")
+    coverletters.add_argument("--resume", help="resume .docx (default $ZODIAC_RESUME)")
+    coverletters.add_argument("--interview", help="interview notes .docx (default $ZODIAC_INTERVIEW)")
+    coverletters.add_argument("--top-k", type=int, default=4, help="resume paragraphs put into each prompt")
+    coverletters.add_argument("--concurrency", type=int, default=2, help="model calls in flight")
+    coverletters.add_argument("--workers", type=int, default=None, help="processes parsing documents")
+    coverletters.set_defaults(func=cmd_coverletters)
+
+    ask = commands.add_parser("ask", help="ask Astra a free-form question")
+    ask.add_argument("question")
+    ask.add_argument("--user", help="keep the conversation in the session store under this id")
+    ask.add_argument("--zodiac")
+    ask.add_argument("--mbti")
+    ask.add_argument("--gender")
+    ask.add_argument("--show-reasoning", action="store_true")
+    ask.set_defaults(func=cmd_ask)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "analyze":
+        from canonical import InvalidInput, canonical_key
+        try:
+            args.zodiac, args.mbti = canonical_key(args.zodiac, args.mbti)
+        except InvalidInput as exc:
+            parser.error(str(exc))
+    if args.record or args.replay:
+        from cassette import CassetteClient
+        from ollama_client import set_client
+        set_client(CassetteClient(args.replay or args.record, "replay" if args.replay else "record",
+                                  pace=args.pace))
+    if args.metrics or args.trace:
+        import telemetry
+        telemetry.enable()
+        if args.trace:
+            telemetry.add_span_exporter(telemetry.JsonLinesExporter(args.trace))
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if args.metrics:
+            sys.stderr.write(telemetry.render())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
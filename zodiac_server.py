@@ -0,0 +1,473 @@
+# asyncio HTTP front-end for DeepSeekR1Model
+#
+#   POST /analyze  {"zodiac": "天蝎座", "mbti": "INFP", "stream": true, "hide_reasoning": true}
+#   POST /chat     {"user_id": "gary", "message": "我适合什么工作？", "stream": true}
+#   GET  /healthz
+#   GET  /metrics  Prometheus text format (with --metrics)
+#
+# "stream": true (or Accept: text/event-stream) answers with server-sent events:
+#   event: chunk  data: {"text": ..., "kind": "reasoning" | "answer"}
+#   event: done   data: {"ttft": ..., "elapsed": ...}
+#   event: error  data: {"status": ..., "error": ...}
+#
+# every model has its own pool of workers behind a bounded queue: a full queue answers 429
+# right away instead of letting latency grow, and a request whose deadline (default
+# --deadline seconds, or the X-Request-Timeout header) passes, either while queued or while
+# generating, gets 504 and its generation is stopped.
+#
+#   python zodiac_server.py --port 8080 --model deepseek-r1:1.5b=2
+#   python zodiac_server.py --fake-ollama          # local testing without a real model
+import argparse
+import asyncio
+import json
+
+import telemetry
+from canonical import InvalidInput, canonical_key
+from ollama_client import OllamaClient
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# events of one job buffered for its client; a worker whose client reads slower waits for it
+EVENT_BUFFER = 256
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error",
+           503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class QueueFull(Exception):
+    pass
+
+
+class _Job:
+    # run: async generator factory producing (event, data) pairs; deadline: loop.time() value
+    def __init__(self, run, deadline):
+        self.run = run
+        self.deadline = deadline
+        self.events = asyncio.Queue(maxsize=EVENT_BUFFER)
+        self.cancelled = False
+        self.queued_at = asyncio.get_running_loop().time()
+
+    async def put(self, item):
+        # nobody reads the events of a cancelled job any more
+        if not self.cancelled:
+            await self.events.put(item)
+
+    def cancel(self):
+        # the client is gone: drop the buffered events, which also unblocks a worker waiting
+        # in put(); the generation stops at its next event
+        self.cancelled = True
+        while not self.events.empty():
+            self.events.get_nowait()
+
+
+class WorkerPool:
+    # workers: generations run at once for this model (match the server's OLLAMA_NUM_PARALLEL),
+    # queue_size: requests allowed to wait for a worker before new ones get 429
+    def __init__(self, name, workers=2, queue_size=32):
+        self.name = name
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.active = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def submit(self, run, deadline):
+        job = _Job(run, deadline)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFull(self.name) from None
+        return job
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.cancelled:
+                    continue
+                remaining = job.deadline - loop.time()
+                if remaining <= 0:
+                    self.timed_out += 1
+                    await job.put(("error", {"status": 504, "error": "deadline exceeded while queued"}))
+                    continue
+                self.active += 1
+                job_span = telemetry.span("zodiac.job", model=self.name,
+                                          queue_wait_seconds=round(loop.time() - job.queued_at, 6))
+                try:
+                    # wait_for cancels the generation when the deadline passes, which closes the
+                    # upstream stream and frees the worker for the next request
+                    with job_span:
+                        await asyncio.wait_for(self._pump(job), remaining)
+                except asyncio.TimeoutError:
+                    self.timed_out += 1
+                    await job.put(("error", {"status": 504, "error": "deadline exceeded"}))
+                except Exception as exc:
+                    await job.put(("error", {"status": 500, "error": str(exc) or type(exc).__name__}))
+                finally:
+                    self.active -= 1
+            finally:
+                await job.put(None)
+                self.queue.task_done()
+
+    async def _pump(self, job):
+        events = job.run()
+        try:
+            async for event in events:
+                if job.cancelled:
+                    break
+                # waits while the client's buffer is full, see _send_events
+                await job.put(event)
+        finally:
+            await events.aclose()
+
+    def stats(self):
+        return {"workers": self.workers, "active": self.active, "queued": self.queue.qsize(),
+                "queue_size": self.queue.maxsize, "rejected": self.rejected, "timed_out": self.timed_out}
+
+
+class ZodiacService:
+    # models: {model name: workers}; the first one is the default for requests without "model"
+    def __init__(self, models=None, client=None, cache=None, sessions=None, queue_size=32, deadline=60.0):
+        from fate_ai import DeepSeekR1Model
+
+        models = models or {"deepseek-r1:1.5b": 2}
+        self.client = client
+        self.default_model = next(iter(models))
+        self.deadline = deadline
+        self.sessions = sessions
+        self.models = {name: DeepSeekR1Model(name, cache=cache, client=client) for name in models}
+        self.pools = {name: WorkerPool(name, workers, queue_size) for name, workers in models.items()}
+        self._server = None
+        telemetry.REGISTRY.add_collector(self._collect_metrics)
+
+    def _collect_metrics(self):
+        for name, pool in self.pools.items():
+            telemetry.QUEUE_DEPTH.set(pool.queue.qsize(), model=name)
+            telemetry.ACTIVE_WORKERS.set(pool.active, model=name)
+
+    async def start(self, host="127.0.0.1", port=8080):
+        for pool in self.pools.values():
+            pool.start()
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    @property
+    def url(self):
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._collect_metrics in telemetry.REGISTRY.collectors:
+            telemetry.REGISTRY.collectors.remove(self._collect_metrics)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for pool in self.pools.values():
+            await pool.stop()
+
+    # -- routing ---------------------------------------------------------------
+
+    async def _route(self, method, path, headers, body):
+        if path == "/healthz":
+            return 200, {"ok": True, "models": {name: pool.stats() for name, pool in self.pools.items()}}
+        if path == "/metrics":
+            if not telemetry.ENABLED:
+                raise HTTPError(404, "metrics are disabled, start the server with --metrics")
+            return 200, telemetry.render()
+        if path not in ("/analyze", "/chat"):
+            raise HTTPError(404, f"no route for {path}")
+        if method != "POST":
+            raise HTTPError(405, "use POST")
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "body must be JSON") from None
+        if not isinstance(request, dict):
+            raise HTTPError(400, "body must be a JSON object")
+
+        name = request.get("model") or self.default_model
+        if name not in self.models:
+            raise HTTPError(400, f"unknown model {name!r}")
+        model = self.models[name]
+        hide_reasoning = bool(request.get("hide_reasoning", True))
+        if path == "/analyze":
+            zodiac, mbti = request.get("zodiac"), request.get("mbti")
+            if not isinstance(zodiac, str) or not isinstance(mbti, str):
+                raise HTTPError(400, "zodiac and mbti are required strings")
+            try:
+                # reject unknown signs / types before they take a queue slot
+                zodiac, mbti = canonical_key(zodiac, mbti)
+            except InvalidInput as exc:
+                raise HTTPError(400, str(exc)) from None
+
+            def run():
+                return self._stream_events(model.astream_personality(zodiac, mbti, hide_reasoning))
+        else:
+            user_id, message = request.get("user_id"), request.get("message")
+            if not isinstance(user_id, str) or not isinstance(message, str):
+                raise HTTPError(400, "user_id and message are required strings")
+            run = self._chat_run(model, user_id, message, hide_reasoning)
+        return self.pools[name], run, request
+
+    def _chat_run(self, model, user_id, message, hide_reasoning):
+        def run():
+            # the model context of the conversation lives on the session's UserMemory, so a
+            # session evicted from the store falls back to its compacted history
+            if self.sessions is not None:
+                memory = self.sessions.get(user_id)
+
+                def on_answer(answer):
+                    self.sessions.remember(user_id, message, answer)
+            else:
+                memory, on_answer = None, None
+            chat = model.chat_session(memory, hide_reasoning=hide_reasoning)
+            return self._stream_events(chat.astream(message, on_answer))
+        return run
+
+    async def _stream_events(self, chunks):
+        async for chunk in chunks:
+            if chunk.done:
+                yield "done", {"ttft": chunk.ttft, "elapsed": round(chunk.elapsed, 4)}
+            else:
+                yield "chunk", {"text": chunk.text, "kind": chunk.kind}
+
+    # -- http ------------------------------------------------------------------
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                method, path, headers, body = await self._read_request(reader)
+                routed = await self._route(method, path, headers, body)
+            except HTTPError as exc:
+                await self._send_json(writer, exc.status, {"error": str(exc)})
+                return
+            if isinstance(routed[0], int):
+                if isinstance(routed[1], str):
+                    await self._send_text(writer, *routed)
+                else:
+                    await self._send_json(writer, *routed)
+                return
+            pool, run, request = routed
+            loop = asyncio.get_running_loop()
+            timeout = headers.get("x-request-timeout") or request.get("timeout")
+            if timeout is None:
+                timeout = self.deadline
+            try:
+                timeout = float(timeout)
+            except (TypeError, ValueError):
+                timeout = None
+            # nan and inf parse as floats but are no deadline
+            if timeout is None or not 0 < timeout < float("inf"):
+                await self._send_json(writer, 400, {"error": "bad timeout"})
+                return
+            deadline = loop.time() + timeout
+            try:
+                job = pool.submit(run, deadline)
+            except QueueFull:
+                await self._send_json(writer, 429, {"error": f"queue for {pool.name} is full"},
+                                      {"Retry-After": "1"})
+                return
+            stream = request.get("stream") or "text/event-stream" in headers.get("accept", "")
+            gone = asyncio.create_task(self._wait_disconnect(reader, job))
+            try:
+                if stream:
+                    await self._send_events(writer, job, gone)
+                else:
+                    await self._send_collected(writer, job, gone)
+            finally:
+                gone.cancel()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(413, "headers too large") from None
+        if len(head) > MAX_HEADER_BYTES:
+            raise HTTPError(413, "headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "bad request line") from None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "bad Content-Length") from None
+        if length < 0:
+            raise HTTPError(400, "bad Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _send_json(self, writer, status, payload, extra_headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json; charset=utf-8", "Content-Length": str(len(data))}
+        headers.update(extra_headers or {})
+        await self._send_head(writer, status, headers)
+        writer.write(data)
+        await writer.drain()
+
+    async def _send_text(self, writer, status, text):
+        data = text.encode("utf-8")
+        await self._send_head(writer, status, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+                                               "Content-Length": str(len(data))})
+        writer.write(data)
+        await writer.drain()
+
+    async def _send_head(self, writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        lines += [f"{key}: {value}" for key, value in headers.items()]
+        lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def _wait_disconnect(self, reader, job):
+        # the request has been read completely, so a read only returns when the client closes
+        # the connection; its job is cancelled then
+        try:
+            await reader.read(1)
+        except ConnectionError:
+            pass
+        job.cancel()
+
+    async def _next_event(self, job, gone):
+        # the next (event, data) of the job, None at its end or when the client went away
+        if not job.events.empty():
+            return job.events.get_nowait()
+        get = asyncio.ensure_future(job.events.get())
+        done, _ = await asyncio.wait((get, gone), return_when=asyncio.FIRST_COMPLETED)
+        if get in done:
+            return get.result()
+        get.cancel()
+        return None
+
+    async def _send_events(self, writer, job, gone):
+        await self._send_head(writer, 200, {"Content-Type": "text/event-stream; charset=utf-8",
+                                            "Cache-Control": "no-cache"})
+        try:
+            while True:
+                item = await self._next_event(job, gone)
+                if item is None:
+                    break
+                event, data = item
+                writer.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                # backpressure: while we wait for a slow client the job's event buffer fills up
+                # and the worker waits in put(), so a slow client slows its own generation
+                await writer.drain()
+        except ConnectionError:
+            job.cancel()
+            raise
+
+    async def _send_collected(self, writer, job, gone):
+        text, reasoning, result = [], [], {}
+        while True:
+            item = await self._next_event(job, gone)
+            if item is None:
+                if job.cancelled:
+                    return
+                break
+            event, data = item
+            if event == "chunk":
+                if data["kind"] == "answer":
+                    text.append(data["text"])
+                else:
+                    reasoning.append(data["text"])
+            elif event == "done":
+                result = data
+            elif event == "error":
+                await self._send_json(writer, data["status"], {"error": data["error"]})
+                return
+        payload = {"text": "".join(text), **result}
+        if reasoning:
+            payload["reasoning"] = "".join(reasoning)
+        await self._send_json(writer, 200, payload)
+
+
+def _parse_models(values):
+    # "deepseek-r1:1.5b=2" -> {"deepseek-r1:1.5b": 2}; the tag itself contains ':'
+    models = {}
+    for value in values or ["deepseek-r1:1.5b=2"]:
+        name, _, workers = value.partition("=")
+        models[name] = int(workers or 2)
+    return models
+
+
+async def serve(args):
+    fake = None
+    host = args.ollama_host
+    if args.fake_ollama:
+        from fake_ollama import FakeOllamaServer
+        fake = FakeOllamaServer()
+        host = fake.start()
+    cache = None
+    if args.cache:
+        from llm_cache import ResponseCache
+        cache = ResponseCache()
+    from session_store import SessionStore
+    service = ZodiacService(_parse_models(args.model), client=OllamaClient(host=host), cache=cache,
+                            sessions=SessionStore(), queue_size=args.queue_size, deadline=args.deadline)
+    await service.start(args.host, args.port)
+    print(f"zodiac service on {service.url}" + (f" (fake ollama at {host})" if fake else ""))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.stop()
+        if fake is not None:
+            fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP service for zodiac x MBTI readings")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--model", action="append", help="MODEL[=WORKERS], may be repeated")
+    parser.add_argument("--queue-size", type=int, default=32, help="waiting requests per model before 429")
+    parser.add_argument("--deadline", type=float, default=60.0, help="default request deadline in seconds")
+    parser.add_argument("--ollama-host", default=None)
+    parser.add_argument("--fake-ollama", action="store_true", help="serve from an in-process fake Ollama")
+    parser.add_argument("--cache", action="store_true", help="use the on-disk response cache")
+    parser.add_argument("--metrics", action="store_true", help="record metrics and serve them on /metrics")
+    parser.add_argument("--trace", metavar="FILE", help="append finished spans to FILE as JSON lines")
+    args = parser.parse_args()
+    if args.metrics or args.trace:
+        telemetry.enable()
+    if args.trace:
+        telemetry.add_span_exporter(telemetry.JsonLinesExporter(args.trace))
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()